@@ -6,7 +6,10 @@ import hmac
 import time
 import random
 import string
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Union
+import numpy as np
 import streamlit as st
 
 class AdvancedSecurity:
@@ -121,49 +124,149 @@ class PerformanceOptimizer:
     """Otimizações de performance para cálculos de arbitragem."""
     
     @staticmethod
-    def cache_calculation(odd1: float, odd2: float, stake: float) -> str:
+    def cache_calculation(odd1: float, odd2: float, stake: float,
+                          bookmaker1: Optional[str] = None, bookmaker2: Optional[str] = None) -> str:
         """
         Cria chave de cache para cálculos.
         
         Args:
             odd1, odd2: Odds
             stake: Montante
+            bookmaker1, bookmaker2: Casas de apostas (os limites afetam as apostas)
             
         Returns:
             Chave de cache
         """
-        return f"{odd1:.3f}_{odd2:.3f}_{stake:.2f}"
+        return f"{odd1:.3f}_{odd2:.3f}_{stake:.2f}_{bookmaker1 or ''}_{bookmaker2 or ''}"
     
     @staticmethod
-    def batch_calculate_opportunities(odds_list: List[tuple]) -> List[Dict]:
+    def batch_calculate_opportunities(odds: Union[Sequence[Sequence[float]], np.ndarray],
+                                      as_records: bool = False) -> Union[Dict[str, np.ndarray], List[Dict]]:
         """
-        Calcula múltiplas oportunidades em lote para melhor performance.
+        Calcula múltiplas oportunidades em lote com NumPy.
         
         Args:
-            odds_list: Lista de tuplas (odd1, odd2)
+            odds: Tuplos (odd1, odd2, ..., oddN), array (linhas × N) ou array estruturado
+                com um campo por resultado. Odds em falta podem vir como NaN ou 0
+                (tuplos de tamanhos diferentes são completados com NaN)
+            as_records: Devolver uma lista de dicionários em vez de colunas
             
         Returns:
-            Lista de resultados calculados
+            Colunas como arrays: odds, implied_prob_sum, total_implied_prob (%),
+            is_arbitrage, profit_percent e stake_share (fração do montante por resultado
+            para pagamento igual). Com as_records, um dicionário por linha com
+            odd1..oddN, is_arbitrage, profit_percent e total_implied_prob
         """
-        results = []
+        if isinstance(odds, np.ndarray) and odds.dtype.names:
+            matrix = np.column_stack([odds[name].astype(float) for name in odds.dtype.names])
+        elif isinstance(odds, np.ndarray):
+            matrix = odds.astype(float, copy=False)
+        else:
+            rows = list(odds)
+            width = max((len(row) for row in rows), default=2)
+            matrix = np.full((len(rows), width), np.nan)
+            for i, row in enumerate(rows):
+                matrix[i, :len(row)] = row
+        matrix = np.atleast_2d(matrix)
         
-        for odd1, odd2 in odds_list:
-            implied_prob1 = 1 / odd1
-            implied_prob2 = 1 / odd2
-            total_implied = implied_prob1 + implied_prob2
-            
-            is_arbitrage = total_implied < 1
-            profit_percent = ((1 / total_implied) - 1) * 100 if is_arbitrage else 0
+        priced = np.isfinite(matrix) & (matrix > 0)
+        inverse = np.where(priced, 1 / np.where(priced, matrix, 1), 0.0)
+        implied_prob_sum = inverse.sum(axis=1)
+        
+        # São precisos pelo menos dois resultados com preço para haver arbitragem
+        is_arbitrage = (priced.sum(axis=1) >= 2) & (implied_prob_sum < 1)
+        safe_sum = np.where(implied_prob_sum > 0, implied_prob_sum, 1)
+        profit_percent = np.where(is_arbitrage, (1 / safe_sum - 1) * 100, 0.0)
+        stake_share = inverse / safe_sum[:, np.newaxis]
+        
+        result = {
+            "odds": matrix,
+            "implied_prob_sum": implied_prob_sum,
+            "total_implied_prob": implied_prob_sum * 100,
+            "is_arbitrage": is_arbitrage,
+            "profit_percent": profit_percent,
+            "stake_share": stake_share
+        }
+        if not as_records:
+            return result
+        
+        odd_names = [f"odd{i + 1}" for i in range(matrix.shape[1])]
+        return [
+            {**dict(zip(odd_names, row_odds)), "is_arbitrage": arb, "profit_percent": profit, "total_implied_prob": implied}
+            for row_odds, arb, profit, implied in zip(
+                matrix.tolist(), is_arbitrage.tolist(), profit_percent.tolist(), result["total_implied_prob"].tolist()
+            )
+        ]
+
+class CalculationCache:
+    """
+    Cache LRU limitada para resultados de cálculos, partilhada pelo processo.
+    
+    Cada interação com um widget volta a correr o script inteiro; com esta cache
+    os cálculos só são refeitos quando as entradas mudam. Os resultados são
+    partilhados e não devem ser alterados por quem os lê.
+    """
+    
+    def __init__(self, max_size: int = 512):
+        """
+        Inicializa a cache.
+        
+        Args:
+            max_size: Número máximo de resultados guardados
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Devolve o resultado guardado para a chave ou calcula-o e guarda-o.
+        
+        Args:
+            key: Chave normalizada (ex: tuplo com cache_calculation)
+            compute: Função que calcula o resultado
             
-            results.append({
-                "odd1": odd1,
-                "odd2": odd2,
-                "is_arbitrage": is_arbitrage,
-                "profit_percent": profit_percent,
-                "total_implied_prob": total_implied * 100
-            })
-        
-        return results
+        Returns:
+            Resultado do cálculo
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        
+        result = compute()
+        
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+    
+    def stats(self) -> Dict:
+        """Devolve os contadores da cache (hits, misses, hit_rate, size)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total * 100 if total else 0.0,
+                "size": len(self._entries)
+            }
+    
+    def clear(self) -> None:
+        """Remove todos os resultados e reinicia os contadores."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+# Cache de cálculos partilhada pelo processo
+calculation_cache = CalculationCache()
 
 class UserExperience:
     """Melhorias de experiência do usuário."""
@@ -2,12 +2,17 @@
 Dashboard de analytics profissional para arbitragem
 """
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import csv
+import importlib.util
+import io
+import json
+import threading
+import time
 import database as db
-from typing import Dict, List, Optional
+from typing import IO, Dict, List, Optional
 
 class AnalyticsDashboard:
     """Dashboard de análise de performance de arbitragem."""
@@ -31,17 +36,17 @@ class AnalyticsDashboard:
         try:
             cursor = conn.cursor()
             
-            # Estatísticas básicas
+            # Estatísticas básicas, lidas dos agregados diários (arbitrage_daily_stats)
             cursor.execute("""
                 SELECT 
-                    COUNT(*) as total_opportunities,
-                    SUM(profit) as total_profit,
-                    AVG(profit_percent) as avg_profit_percent,
-                    MAX(profit) as max_profit,
-                    MIN(profit) as min_profit,
-                    SUM(total_stake) as total_wagered
-                FROM arbitrage_opportunities 
-                WHERE date_created >= NOW() - INTERVAL '%s days'
+                    SUM(opportunities) as total_opportunities,
+                    SUM(total_profit) as total_profit,
+                    SUM(sum_profit_percent) / NULLIF(SUM(opportunities), 0) as avg_profit_percent,
+                    MAX(max_profit) as max_profit,
+                    MIN(min_profit) as min_profit,
+                    SUM(total_wagered) as total_wagered
+                FROM arbitrage_daily_stats 
+                WHERE day >= (NOW() - INTERVAL '1 day' * %s)::date
             """, (days,))
             
             stats = cursor.fetchone()
@@ -49,22 +54,23 @@ class AnalyticsDashboard:
             # Lucro por dia
             cursor.execute("""
                 SELECT 
-                    DATE(date_created) as date,
-                    SUM(profit) as daily_profit,
-                    COUNT(*) as daily_count
-                FROM arbitrage_opportunities 
-                WHERE date_created >= NOW() - INTERVAL '%s days'
-                GROUP BY DATE(date_created)
-                ORDER BY date
+                    day as date,
+                    SUM(total_profit) as daily_profit,
+                    SUM(opportunities) as daily_count
+                FROM arbitrage_daily_stats 
+                WHERE day >= (NOW() - INTERVAL '1 day' * %s)::date
+                GROUP BY day
+                ORDER BY day
             """, (days,))
             
             daily_data = cursor.fetchall()
             
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             
             return {
-                "total_opportunities": stats[0] or 0,
+                "total_opportunities": int(stats[0] or 0),
                 "total_profit": float(stats[1] or 0),
                 "avg_profit_percent": float(stats[2] or 0),
                 "max_profit": float(stats[3] or 0),
@@ -75,7 +81,7 @@ class AnalyticsDashboard:
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return {}
     
     @staticmethod
@@ -184,17 +190,25 @@ class AnalyticsDashboard:
         return fig
     
     @staticmethod
-    def create_bookmaker_analysis() -> go.Figure:
+    def create_bookmaker_analysis(days: int = 30) -> go.Figure:
         """
         Cria análise de performance por casa de apostas.
         
+        Args:
+            days: Número de dias para análise
+            
         Returns:
             Figura Plotly
         """
-        # Dados simulados para demonstração
-        bookmakers = ['Betano.pt', '888Starz', 'Placard.pt', 'Betclic.pt']
-        opportunities = [45, 38, 22, 15]
-        avg_profit = [2.3, 2.8, 1.9, 2.1]
+        stats = bookmaker_analytics.get_stats(days)[:10]
+        
+        bookmakers = [row["bookmaker"] for row in stats]
+        opportunities = [row["opportunities"] for row in stats]
+        avg_profit = [round(row["avg_profit_percent"], 2) for row in stats]
+        hover = [
+            f"Stake médio: €{row['avg_stake']:.2f}<br>Presença: {row['hit_rate']:.1f}% das oportunidades"
+            for row in stats
+        ]
         
         fig = go.Figure()
         
@@ -203,6 +217,7 @@ class AnalyticsDashboard:
             y=opportunities,
             name="Oportunidades",
             marker_color='rgba(51, 102, 255, 0.7)',
+            hovertext=hover,
             yaxis="y"
         ))
         
@@ -227,6 +242,165 @@ class AnalyticsDashboard:
         
         return fig
 
+class BookmakerAnalytics:
+    """
+    Estatísticas por casa de apostas, agregadas por dia e atualizadas incrementalmente.
+    
+    Guarda agregados diários (bookmaker1 e bookmaker2) dos últimos max_days e só
+    lê da base de dados as oportunidades com id acima da última vista. Se o total
+    por dia deixar de bater certo com arbitrage_daily_stats (exclusões ou inserções
+    concorrentes com ids antigos), os agregados são reconstruídos.
+    """
+    
+    def __init__(self, max_days: int = 365, refresh_interval: float = 30.0):
+        """
+        Inicializa a cache.
+        
+        Args:
+            max_days: Janela máxima coberta pela cache
+            refresh_interval: Intervalo mínimo entre consultas à base de dados (segundos)
+        """
+        self.max_days = max_days
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._buckets: Dict[date, Dict[str, List[float]]] = {}
+        self._day_counts: Dict[date, int] = {}
+        self._watermark = 0
+        self._since: Optional[date] = None
+        self._last_refresh = 0.0
+    
+    def get_stats(self, days: int = 30) -> List[Dict]:
+        """
+        Devolve as estatísticas por casa de apostas para os últimos dias.
+        
+        Args:
+            days: Número de dias para análise
+            
+        Returns:
+            Lista de dicionários (bookmaker, opportunities, avg_profit_percent,
+            avg_stake, hit_rate), ordenada por número de oportunidades
+        """
+        with self._lock:
+            if time.time() - self._last_refresh >= self.refresh_interval:
+                self._refresh()
+            
+            since = date.today() - timedelta(days=days)
+            totals: Dict[str, List[float]] = {}
+            window_count = 0
+            for day, bucket in self._buckets.items():
+                if day < since:
+                    continue
+                window_count += self._day_counts.get(day, 0)
+                for bookmaker, (count, profit_percent, stake) in bucket.items():
+                    total = totals.setdefault(bookmaker, [0, 0.0, 0.0])
+                    total[0] += count
+                    total[1] += profit_percent
+                    total[2] += stake
+        
+        stats = [
+            {
+                "bookmaker": bookmaker,
+                "opportunities": int(count),
+                "avg_profit_percent": profit_percent / count,
+                "avg_stake": stake / count,
+                "hit_rate": count / window_count * 100 if window_count else 0.0
+            }
+            for bookmaker, (count, profit_percent, stake) in totals.items()
+        ]
+        stats.sort(key=lambda row: (-row["opportunities"], row["bookmaker"]))
+        return stats
+    
+    def _reset(self) -> None:
+        self._buckets = {}
+        self._day_counts = {}
+        self._watermark = 0
+        self._since = date.today() - timedelta(days=self.max_days)
+    
+    def _refresh(self) -> None:
+        if self._since is None:
+            self._reset()
+        
+        # Descartar os dias que saíram da janela máxima
+        since = date.today() - timedelta(days=self.max_days)
+        if self._since < since:
+            self._buckets = {day: bucket for day, bucket in self._buckets.items() if day >= since}
+            self._day_counts = {day: count for day, count in self._day_counts.items() if day >= since}
+            self._since = since
+        
+        conn = db.get_connection()
+        if not conn:
+            return
+        
+        try:
+            cursor = conn.cursor()
+            if self._fetch(cursor) and not self._matches_rollup(cursor):
+                self._reset()
+                self._fetch(cursor)
+            cursor.close()
+            db.release_connection(conn)
+            conn = None
+            self._last_refresh = time.time()
+        except Exception as e:
+            print(f"Erro ao atualizar estatísticas por casa de apostas: {e}")
+            db.release_connection(conn)
+    
+    def _fetch(self, cursor) -> bool:
+        """Junta aos agregados as oportunidades acima do watermark; devolve se havia uma cache anterior."""
+        had_cache = self._watermark > 0
+        
+        # Ambas as consultas ficam limitadas ao mesmo intervalo de ids: cada instrução vê
+        # um snapshot novo, e linhas confirmadas entre elas entrariam só numa das duas
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM arbitrage_opportunities")
+        max_id = cursor.fetchone()[0]
+        if max_id <= self._watermark:
+            return had_cache
+        params = (self._watermark, max_id, self._since)
+        
+        cursor.execute("""
+            SELECT date_created::date, COUNT(*)
+            FROM arbitrage_opportunities
+            WHERE id > %s AND id <= %s AND date_created >= %s
+            GROUP BY 1
+        """, params)
+        for day, count in cursor.fetchall():
+            self._day_counts[day] = self._day_counts.get(day, 0) + count
+        
+        cursor.execute("""
+            SELECT date_created::date, bookmaker, COUNT(*), SUM(profit_percent), SUM(stake)
+            FROM (
+                SELECT date_created, bookmaker1 AS bookmaker, stake1 AS stake, profit_percent
+                FROM arbitrage_opportunities WHERE id > %s AND id <= %s AND date_created >= %s
+                UNION ALL
+                SELECT date_created, bookmaker2, stake2, profit_percent
+                FROM arbitrage_opportunities WHERE id > %s AND id <= %s AND date_created >= %s
+            ) AS legs
+            WHERE bookmaker IS NOT NULL
+            GROUP BY 1, 2
+        """, params + params)
+        for day, bookmaker, count, profit_percent, stake in cursor.fetchall():
+            bucket = self._buckets.setdefault(day, {}).setdefault(bookmaker, [0, 0.0, 0.0])
+            bucket[0] += count
+            bucket[1] += float(profit_percent or 0)
+            bucket[2] += float(stake or 0)
+        
+        self._watermark = max_id
+        return had_cache
+    
+    def _matches_rollup(self, cursor) -> bool:
+        """Compara o total de oportunidades por dia com arbitrage_daily_stats."""
+        cursor.execute("""
+            SELECT day, SUM(opportunities)
+            FROM arbitrage_daily_stats
+            WHERE day >= %s
+            GROUP BY day
+        """, (self._since,))
+        expected = {day: int(count) for day, count in cursor.fetchall() if count}
+        actual = {day: count for day, count in self._day_counts.items() if count}
+        return expected == actual
+
+# Cache partilhada pelo processo
+bookmaker_analytics = BookmakerAnalytics()
+
 def show_analytics_dashboard(user_data: Dict):
     """
     Mostra dashboard de analytics completo.
@@ -308,7 +482,7 @@ def show_analytics_dashboard(user_data: Dict):
     
     with col2:
         st.markdown("### 🏢 Performance por Casa")
-        bookmaker_chart = AnalyticsDashboard.create_bookmaker_analysis()
+        bookmaker_chart = AnalyticsDashboard.create_bookmaker_analysis(days)
         st.plotly_chart(bookmaker_chart, use_container_width=True)
     
     # Insights automáticos
@@ -332,19 +506,116 @@ def show_analytics_dashboard(user_data: Dict):
     else:
         st.info("Execute alguns cálculos para obter insights personalizados")
 
-def export_data_to_csv(user_data: Dict) -> str:
+# Colunas exportadas do histórico, por esta ordem
+EXPORT_COLUMNS = [
+    "id", "date_created", "event_name", "odd1", "odd2", "total_stake", "stake1", "stake2",
+    "profit", "profit_percent", "bookmaker1", "bookmaker2", "outcomes"
+]
+
+def _export_value(value):
+    """Converte um valor da base de dados para uma célula exportável."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+def write_history_csv(fileobj: IO[str], user_id: Optional[int] = None, batch_size: int = 2000) -> int:
     """
-    Exporta dados do utilizador para CSV.
+    Escreve o histórico em CSV, lote a lote, sem limite de linhas.
+    
+    Args:
+        fileobj: Ficheiro de texto onde escrever
+        user_id: Restringir ao histórico de um utilizador
+        batch_size: Linhas lidas da base de dados por lote
+        
+    Returns:
+        Número de linhas escritas
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(EXPORT_COLUMNS)
+    total = 0
+    for rows in db.iter_arbitrage_history(EXPORT_COLUMNS, user_id=user_id, batch_size=batch_size):
+        writer.writerows([_export_value(value) for value in row] for row in rows)
+        total += len(rows)
+    return total
+
+def write_history_parquet(fileobj: IO[bytes], user_id: Optional[int] = None, batch_size: int = 2000) -> int:
+    """
+    Escreve o histórico em Parquet, um row group por lote (requer pyarrow).
+    
+    Args:
+        fileobj: Ficheiro binário onde escrever
+        user_id: Restringir ao histórico de um utilizador
+        batch_size: Linhas lidas da base de dados por lote
+        
+    Returns:
+        Número de linhas escritas
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    numeric = pa.float64()
+    text = pa.string()
+    schema = pa.schema([
+        ("id", pa.int64()), ("date_created", pa.timestamp("us")), ("event_name", text),
+        ("odd1", numeric), ("odd2", numeric), ("total_stake", numeric), ("stake1", numeric),
+        ("stake2", numeric), ("profit", numeric), ("profit_percent", numeric),
+        ("bookmaker1", text), ("bookmaker2", text), ("outcomes", text)
+    ])
+    
+    total = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for rows in db.iter_arbitrage_history(EXPORT_COLUMNS, user_id=user_id, batch_size=batch_size):
+            columns = dict(zip(EXPORT_COLUMNS, zip(*rows)))
+            columns["outcomes"] = [_export_value(v) for v in columns["outcomes"]]
+            arrays = []
+            for field in schema:
+                values = columns[field.name]
+                # Valores DECIMAL de bases antigas são convertidos para float
+                if field.type == numeric:
+                    values = [float(v) if v is not None else None for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            total += len(rows)
+    return total
+
+def export_formats() -> List[str]:
+    """Formatos de exportação disponíveis (Parquet só com pyarrow instalado)."""
+    formats = ["csv"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append("parquet")
+    return formats
+
+def export_history(user_data: Dict, file_format: str = "csv") -> Optional[bytes]:
+    """
+    Exporta o histórico do utilizador para um buffer em memória.
+    
+    Nada é escrito em disco: o conteúdo é entregue apenas ao
+    st.download_button da sessão do utilizador.
     
     Args:
         user_data: Dados do utilizador
+        file_format: Um dos formatos de export_formats()
         
     Returns:
-        Dados CSV como string
+        Conteúdo do ficheiro, ou None em caso de erro
     """
+    if file_format not in export_formats():
+        print(f"Formato de exportação indisponível: {file_format}")
+        return None
+    
+    user_id = user_data.get('id') if user_data else None
+    buffer = io.BytesIO()
     try:
-        history = db.get_arbitrage_history(1000)  # Últimas 1000 entradas
-        df = pd.DataFrame(history)
-        return df.to_csv(index=False)
-    except Exception:
-        return "Erro ao exportar dados"
\ No newline at end of file
+        if file_format == "parquet":
+            write_history_parquet(buffer, user_id=user_id)
+        else:
+            text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+            write_history_csv(text, user_id=user_id)
+            text.flush()
+            text.detach()
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Erro ao exportar dados: {e}")
+        return None
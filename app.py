@@ -5,17 +5,20 @@ from datetime import datetime
 import database as db
 import base64
 import random
+import secrets
 from pathlib import Path
 import odds_api
+from odds_snapshot import snapshot_store
+from odds_poller import start_background_poller
 import time
 import threading
 from typing import List, Dict, Any, Optional, Tuple
 from security_utils import SecurityUtils, RateLimiter, rate_limit_decorator, validate_environment_variables
 from bookmaker_helpers import BookmakerHelpers, ArbitrageAnalyzer
-from advanced_security import AdvancedSecurity, PerformanceOptimizer, UserExperience, init_advanced_features
+from advanced_security import AdvancedSecurity, PerformanceOptimizer, UserExperience, calculation_cache, init_advanced_features
 from user_management import init_authentication, require_authentication, show_pricing_page, SubscriptionManager
 from mobile_optimization import inject_mobile_optimizations, add_ios_meta_tags
-from analytics_dashboard import show_analytics_dashboard, export_data_to_csv
+from analytics_dashboard import show_analytics_dashboard, export_history, export_formats
 from webapp_optimizer import inject_desktop_features, create_sharing_features, add_accessibility_features, inject_performance_monitoring
 from payment_system import PaymentSystem, show_pricing_page, init_payment_system
 
@@ -29,8 +32,12 @@ st.set_page_config(
 # Validar variáveis de ambiente na inicialização
 validate_environment_variables()
 
-# Inicializar rate limiter para API
-api_rate_limiter = RateLimiter(max_calls=30, time_window=60)
+# Rate limiter partilhado pelo processo (sobrevive aos reruns do script)
+@st.cache_resource
+def get_api_rate_limiter():
+    return RateLimiter(max_calls=30, time_window=60)
+
+api_rate_limiter = get_api_rate_limiter()
 
 # Inicializar funcionalidades avançadas
 init_advanced_features()
@@ -150,13 +157,49 @@ if 'temp_odd1' not in st.session_state:
 if 'temp_odd2' not in st.session_state:
     st.session_state.temp_odd2 = 1.90
 
+# Cliente da API partilhado por todas as sessões do processo (pool de ligações HTTP)
+@st.cache_resource
+def get_odds_client():
+    # Snapshots partilhados: refreshes simultâneos de várias sessões geram uma única busca
+    return odds_api.OddsAPI(snapshot_store=snapshot_store)
+
+# Poller em segundo plano iniciado uma única vez por processo (None sem ODDS_API_KEY)
+@st.cache_resource
+def get_odds_poller():
+    return start_background_poller(get_odds_client())
+
+odds_poller = get_odds_poller()
+
+# Ler as oportunidades publicadas pelo poller - nunca espera pela rede
+if odds_poller is not None:
+    cached_odds, snapshot_time = get_odds_client().get_cached_opportunities(min_profit=0.5)
+    if snapshot_time:
+        st.session_state.api_odds = cached_odds
+        st.session_state.last_api_check = snapshot_time
+
+# Bucket de rate limit por utilizador (ou por sessão, se anónimo): o limiter é partilhado
+# pelo processo e um utilizador não deve esgotar os pedidos dos restantes
+def rate_limit_bucket(name):
+    user_id = current_user_id()
+    if user_id is not None:
+        return f"{name}:user:{user_id}"
+    if 'rate_limit_session' not in st.session_state:
+        st.session_state.rate_limit_session = secrets.token_hex(8)
+    return f"{name}:session:{st.session_state.rate_limit_session}"
+
 # Função para carregar oportunidades de arbitragem da API com rate limiting
-@rate_limit_decorator(api_rate_limiter)
+@rate_limit_decorator(api_rate_limiter, bucket=lambda: rate_limit_bucket("load"))
 def load_arbitrage_opportunities():
+    # Com o poller ativo, apenas antecipar a próxima atualização em segundo plano
+    if odds_poller is not None:
+        odds_poller.request_refresh()
+        st.info("Atualização pedida. As novas odds aparecem em instantes.")
+        return st.session_state.api_odds
+    
     try:
         st.session_state.api_loading = True
-        api = odds_api.OddsAPI()
-        opportunities = api.find_arbitrage_opportunities(min_profit=0.5)
+        api = get_odds_client()
+        opportunities = api.find_arbitrage_opportunities(min_profit=0.5, force_refresh=True)
         st.session_state.api_odds = opportunities
         st.session_state.last_api_check = time.time()
         st.session_state.api_loading = False
@@ -166,6 +209,51 @@ def load_arbitrage_opportunities():
         st.session_state.api_loading = False
         return []
 
+# Descrição legível de uma oportunidade (mercados com linha e outrights incluídos)
+def describe_opportunity(opp):
+    if opp.get('home_team') and opp.get('away_team'):
+        label = f"{opp['home_team']} vs {opp['away_team']}"
+    else:
+        label = opp['sport']
+    market = opp.get('market', 'h2h')
+    if market != 'h2h':
+        label += f" ({market} {opp['line']})" if opp.get('line') is not None else f" ({market})"
+    return label
+
+# Nome de um resultado com a sua linha (ex: Over 2.5, Benfica -1.5)
+def describe_outcome(outcome, market='h2h'):
+    if outcome.get('point') is None:
+        return outcome['name']
+    point = f"{outcome['point']:+g}" if 'spreads' in market else f"{outcome['point']:g}"
+    return f"{outcome['name']} {point}"
+
+# Id do utilizador autenticado (None se anónimo)
+def current_user_id():
+    if st.session_state.get('authenticated') and st.session_state.get('user_data'):
+        return st.session_state.user_data.get('id')
+    return None
+
+# Converter uma oportunidade da API num registo para o histórico
+def opportunity_to_record(opp, total_stake):
+    split = BookmakerHelpers.calculate_optimal_stakes_n(
+        [outcome['odd'] for outcome in opp['outcomes']],
+        total_stake,
+        [outcome['bookmaker'] for outcome in opp['outcomes']]
+    )
+    outcomes = [
+        {"name": outcome['name'], "point": outcome.get('point'), "odd": outcome['odd'],
+         "bookmaker": outcome['bookmaker'], "stake": stake}
+        for outcome, stake in zip(opp['outcomes'], split['stakes'])
+    ]
+    return {
+        "total_stake": split['total_adjusted'],
+        "profit": split['guaranteed_profit'],
+        "profit_percent": split['profit_percent'],
+        "event_name": describe_opportunity(opp),
+        "outcomes": outcomes,
+        "user_id": current_user_id()
+    }
+
 # Função para selecionar uma oportunidade específica
 def select_opportunity(opportunity_index):
     opportunity = st.session_state.api_odds[opportunity_index]
@@ -373,6 +461,15 @@ with tab2:
         time_since_check = time.time() - st.session_state.last_api_check
         if time_since_check > 300:  # 5 minutos
             st.info("Os dados podem estar desatualizados. Considere atualizar as oportunidades.")
+        
+        # Esportes servidos a partir do último snapshot válido porque a API falhou
+        stale_sports = sorted({opp.get('sport', '') for opp in st.session_state.api_odds if opp.get('stale')})
+        if stale_sports:
+            oldest = min(opp['fetched_at'] for opp in st.session_state.api_odds if opp.get('stale'))
+            st.warning(
+                f"API indisponível para {', '.join(stale_sports)}: a mostrar odds de há "
+                f"{int((time.time() - oldest) // 60)} min."
+            )
     
     with col2:
         if st.button("🔄 Atualizar Odds", use_container_width=True):
@@ -394,8 +491,6 @@ with tab2:
         # Criar DataFrame para exibição de oportunidades
         opportunities_data = []
         for i, opp in enumerate(st.session_state.api_odds):
-            home_team = opp['home_team']
-            away_team = opp['away_team']
             profit = opp['profit_percent']
             
             # Construir nomes das casas de apostas
@@ -404,7 +499,7 @@ with tab2:
             
             opportunities_data.append({
                 "ID": i,
-                "Jogo": f"{home_team} vs {away_team}",
+                "Jogo": describe_opportunity(opp),
                 "Lucro": f"{profit:.2f}%",
                 "Casas de Apostas": bookmakers_str
             })
@@ -442,8 +537,19 @@ with tab2:
                 format_func=lambda x: f"{opportunities_data[x]['Jogo']} - Lucro: {opportunities_data[x]['Lucro']}"
             )
             
-            if st.button("✅ Usar esta oportunidade", type="primary"):
-                select_opportunity(selected_id)
+            col_use, col_archive = st.columns(2)
+            with col_use:
+                if st.button("✅ Usar esta oportunidade", type="primary"):
+                    select_opportunity(selected_id)
+            with col_archive:
+                if st.button("📥 Arquivar todas", help="Guarda todas as oportunidades listadas no histórico"):
+                    saved_ids = db.save_arbitrage_opportunities(
+                        [opportunity_to_record(opp, total_stake) for opp in st.session_state.api_odds]
+                    )
+                    if saved_ids is None:
+                        st.error("Erro ao arquivar. Verifica a ligação à base de dados.")
+                    else:
+                        st.success(f"{len(saved_ids)} oportunidades arquivadas.")
         else:
             st.info("Nenhuma oportunidade de arbitragem encontrada. Tente novamente mais tarde.")
         
@@ -458,7 +564,7 @@ with tab2:
         
         st.markdown(f"""
         <div style='margin-bottom: 1rem;'>
-            <p><strong>Jogo:</strong> {opp['home_team']} vs {opp['away_team']}</p>
+            <p><strong>Jogo:</strong> {describe_opportunity(opp)}</p>
             <p><strong>Lucro potencial:</strong> {opp['profit_percent']:.2f}%</p>
         </div>
         """, unsafe_allow_html=True)
@@ -466,12 +572,41 @@ with tab2:
         # Mostrar cada uma das odds com seus bookmakers
         st.markdown("<p><strong>Odds disponíveis:</strong></p>", unsafe_allow_html=True)
         for outcome in opp['outcomes']:
+            outcome_name = describe_outcome(outcome, opp.get('market', 'h2h'))
             st.markdown(f"""
             <div style='background: rgba(51, 102, 255, 0.1); padding: 0.5rem; margin-bottom: 0.5rem; border-radius: 4px;'>
-                <p style='margin: 0;'><strong>{outcome['name']}:</strong> {outcome['odd']} ({outcome['bookmaker']})</p>
+                <p style='margin: 0;'><strong>{outcome_name}:</strong> {outcome['odd']} ({outcome['bookmaker']})</p>
             </div>
             """, unsafe_allow_html=True)
         
+        # Mercados com mais de dois resultados: distribuição para todos os resultados
+        if len(opp['outcomes']) > 2:
+            n_way = BookmakerHelpers.calculate_optimal_stakes_n(
+                [outcome['odd'] for outcome in opp['outcomes']],
+                total_stake,
+                [outcome['bookmaker'] for outcome in opp['outcomes']]
+            )
+            st.markdown("<p><strong>Distribuição para todos os resultados:</strong></p>", unsafe_allow_html=True)
+            for outcome, stake in zip(opp['outcomes'], n_way['stakes']):
+                st.markdown(f"• {describe_outcome(outcome, opp.get('market', 'h2h'))}: €{stake:.2f} @ {outcome['odd']} ({outcome['bookmaker']})")
+            st.markdown(f"Lucro garantido: **€{n_way['guaranteed_profit']:.2f}** ({n_way['profit_percent']:.2f}%)")
+            for warning in n_way['warnings']:
+                st.warning(f"⚠️ {warning}")
+        
+        # Combinações alternativas para contornar limites de aposta da melhor casa
+        alternatives = get_odds_client().get_top_combinations(
+            opp['id'], market=opp.get('market', 'h2h'), k=5, min_profit=0.0, line=opp.get('line')
+        )
+        if len(alternatives) > 1:
+            with st.expander("Combinações alternativas de casas de apostas"):
+                for combination in alternatives:
+                    legs = []
+                    for outcome in combination['outcomes']:
+                        info = BookmakerHelpers.get_bookmaker_info(outcome['bookmaker'])
+                        limit = f", máx. €{info['max_bet']:,.0f}" if info else ""
+                        legs.append(f"{describe_outcome(outcome, combination['market'])} @ {outcome['odd']} ({outcome['bookmaker']}{limit})")
+                    st.markdown(f"• **{combination['profit_percent']:.2f}%** — " + " | ".join(legs))
+
         st.markdown("</div>", unsafe_allow_html=True)  # Fechar o card
 
 # Cálculos
@@ -553,8 +688,14 @@ else:
 
 st.markdown("</div>", unsafe_allow_html=True)  # Fechar o card
 
+# Chave normalizada das entradas da calculadora: os resultados abaixo só são recalculados quando mudam
+calc_key = PerformanceOptimizer.cache_calculation(odd1, odd2, total_stake, bookmaker1, bookmaker2)
+
 # Análise avançada da oportunidade
-market_analysis = ArbitrageAnalyzer.calculate_market_efficiency(odd1, odd2)
+market_analysis = calculation_cache.get_or_compute(
+    ("market_efficiency", calc_key),
+    lambda: ArbitrageAnalyzer.calculate_market_efficiency(odd1, odd2)
+)
 
 # Exibir análise de qualidade
 st.markdown("<br>", unsafe_allow_html=True)
@@ -594,8 +735,11 @@ st.markdown("</div>", unsafe_allow_html=True)
 # Verificar se a arbitragem é possível
 if total_implied_prob < 1:
     # Arbitragem é possível - usar análise avançada
-    advanced_calc = BookmakerHelpers.calculate_optimal_stakes_with_limits(
-        odd1, odd2, total_stake, bookmaker1, bookmaker2
+    advanced_calc = calculation_cache.get_or_compute(
+        ("optimal_stakes", calc_key),
+        lambda: BookmakerHelpers.calculate_optimal_stakes_with_limits(
+            odd1, odd2, total_stake, bookmaker1, bookmaker2
+        )
     )
     
     stake1 = advanced_calc["stake1"]
@@ -604,7 +748,10 @@ if total_implied_prob < 1:
     profit_percent = advanced_calc["profit_percent"]
     
     # Análise de urgência
-    time_analysis = ArbitrageAnalyzer.estimate_time_sensitivity(profit_percent)
+    time_analysis = calculation_cache.get_or_compute(
+        ("time_sensitivity", calc_key),
+        lambda: ArbitrageAnalyzer.estimate_time_sensitivity(profit_percent)
+    )
     
     # Criar um card com estilo moderno para a distribuição de apostas
     st.markdown("<br>", unsafe_allow_html=True)
@@ -697,7 +844,7 @@ if total_implied_prob < 1:
     
     if st.session_state.selected_opportunity:
         opp = st.session_state.selected_opportunity
-        event_name = f"{opp['home_team']} vs {opp['away_team']}"
+        event_name = describe_opportunity(opp)
         
         if len(opp['outcomes']) >= 2:
             bookmaker1 = opp['outcomes'][0]['bookmaker']
@@ -718,7 +865,8 @@ if total_implied_prob < 1:
             
             saved_id = db.save_arbitrage_opportunity(
                 odd1, odd2, total_stake, stake1, stake2, profit, profit_percent,
-                event_name=event_name, bookmaker1=bookmaker1, bookmaker2=bookmaker2
+                event_name=event_name, bookmaker1=bookmaker1, bookmaker2=bookmaker2,
+                user_id=current_user_id()
             )
             if saved_id:
                 # Actualizar totais da sessão
@@ -742,8 +890,11 @@ if total_implied_prob < 1:
             share_text = f"Encontrei uma oportunidade de arbitragem com odds {odd1:.2f} e {odd2:.2f}, gerando um lucro garantido de {profit_percent:.2f}%!"
         
         # Usar um componente de botão HTML com funcionalidade de copiar
-        betting_instructions = BookmakerHelpers.format_bet_instructions(
-            stake1, stake2, odd1, odd2, bookmaker1, bookmaker2, event_name
+        betting_instructions = calculation_cache.get_or_compute(
+            ("bet_instructions", calc_key, bookmaker1, bookmaker2, event_name),
+            lambda: BookmakerHelpers.format_bet_instructions(
+                stake1, stake2, odd1, odd2, bookmaker1, bookmaker2, event_name
+            )
         )
         
         # Botões de partilha avançados
@@ -788,7 +939,10 @@ if total_implied_prob < 1:
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown("<h3 style='font-size: 1.3rem; margin-bottom: 1rem;'>💡 Dicas Específicas</h3>", unsafe_allow_html=True)
     
-    betting_tips = BookmakerHelpers.get_betting_tips(bookmaker1, bookmaker2)
+    betting_tips = calculation_cache.get_or_compute(
+        ("betting_tips", bookmaker1, bookmaker2),
+        lambda: BookmakerHelpers.get_betting_tips(bookmaker1, bookmaker2)
+    )
     tips_html = ""
     for tip in betting_tips[:6]:  # Mostrar apenas 6 dicas mais relevantes
         tips_html += f"<p style='margin: 0.5rem 0; padding: 0.3rem 0; border-bottom: 1px solid rgba(255,255,255,0.1);'>{tip}</p>"
@@ -920,14 +1074,19 @@ with tab4:
         
         # Exportar dados
         st.markdown("### 📥 Exportar Dados")
-        if st.button("Exportar Histórico (CSV)", key="export_csv"):
-            csv_data = export_data_to_csv(user_data)
-            st.download_button(
-                "Descarregar CSV",
-                csv_data,
-                file_name=f"arbitragem_historico_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
-            )
+        export_format = st.radio("Formato", export_formats(), horizontal=True, key="export_format")
+        if st.button("Exportar Histórico", key="export_csv"):
+            export_data = export_history(user_data, export_format)
+            if export_data is not None:
+                # Entregue apenas à sessão do utilizador; nada fica numa pasta pública
+                st.download_button(
+                    f"Descarregar {export_format.upper()}",
+                    export_data,
+                    file_name=f"arbitragem_historico_{datetime.now().strftime('%Y%m%d')}.{export_format}",
+                    mime="text/csv" if export_format == "csv" else "application/octet-stream"
+                )
+            else:
+                st.error("Erro ao exportar dados.")
         
         # Upgrade de plano
         if not user_data['is_premium']:
@@ -968,7 +1127,7 @@ with st.sidebar.expander("🎯 Definir Meta de Lucro", expanded=True):
     
     # Calcular progresso atual (baseado no histórico)
     try:
-        today_history = db.get_arbitrage_history(50)  # Pegar mais registos para filtrar por hoje
+        today_history = db.get_arbitrage_history(50, user_id=current_user_id())  # Pegar mais registos para filtrar por hoje
         today_profit = sum([item['profit'] for item in today_history if 
                            pd.to_datetime(item['date_created']).date() == pd.Timestamp.now().date()])
         
@@ -1063,7 +1222,7 @@ def render_history_item(item):
 
 # Carregar histórico de arbitragem
 try:
-    history = db.get_arbitrage_history(10)
+    history = db.get_arbitrage_history(10, user_id=current_user_id())
     
     if history and len(history) > 0:
         # Converter para DataFrame do pandas
@@ -1108,10 +1267,11 @@ try:
         
         # Botão para limpar histórico com estilo melhorado
         if st.sidebar.button("🗑️ Limpar Histórico", type="secondary", use_container_width=True):
-            for entry in history:
-                db.delete_arbitrage_opportunity(entry['id'])
-            st.sidebar.success("✅ Histórico limpo com sucesso!")
-            st.rerun()
+            if db.delete_arbitrage_opportunities(ids=[entry['id'] for entry in history]) is not None:
+                st.sidebar.success("✅ Histórico limpo com sucesso!")
+                st.rerun()
+            else:
+                st.sidebar.error("Erro ao limpar o histórico.")
     else:
         st.sidebar.markdown("""
         <div style='padding: 1rem; border-radius: 10px; background: rgba(255, 255, 255, 0.05); text-align: center;'>
@@ -3,6 +3,7 @@ import math
 import pandas as pd
 from datetime import datetime
 import database as db
+from migrations import ensure_schema
 import base64
 import random
 from pathlib import Path
@@ -15,6 +16,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Aplicar migrações de esquema pendentes (uma vez por processo)
+ensure_schema()
+
 # CSS Mobile Profissional
 st.markdown("""
 <style>
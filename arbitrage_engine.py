@@ -0,0 +1,620 @@
+"""
+Motor vetorizado de deteção de arbitragem sobre matrizes de preços NumPy
+"""
+import heapq
+import threading
+import numpy as np
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Índices dos resultados no eixo de outcomes para o mercado h2h
+HOME, AWAY, DRAW = 0, 1, 2
+
+# Resultados obrigatórios no h2h: casa e fora (o empate só conta quando existe)
+H2H_REQUIRED = np.array([True, True, False])
+
+# Mercados com linha (point) em que cada linha forma um mercado de dois resultados
+LINE_MARKETS = ("totals", "spreads", "alternate_totals", "alternate_spreads")
+
+
+class PriceMatrix(NamedTuple):
+    """Preços empacotados num array (eventos × bookmakers × outcomes)."""
+    events: List[Dict[str, Any]]
+    bookmakers: List[List[str]]
+    prices: np.ndarray
+
+
+class MarketMatrix(NamedTuple):
+    """
+    Preços de um mercado genérico empacotados em (linhas × bookmakers × outcomes).
+    
+    Cada linha é um par (evento, linha do mercado); outcomes[r] lista os pares
+    (nome, point) de cada coluna e mask indica as colunas que existem.
+    """
+    rows: List[Tuple[Dict[str, Any], Optional[float]]]
+    outcomes: List[List[Tuple[str, Optional[float]]]]
+    bookmakers: List[List[str]]
+    prices: np.ndarray
+    mask: np.ndarray
+
+
+class ArbitrageEngine:
+    """Deteção de arbitragem em lote para todos os eventos de um esporte."""
+    
+    @staticmethod
+    def pack_h2h(games: List[Dict[str, Any]]) -> PriceMatrix:
+        """
+        Empacota as odds h2h num array (eventos × bookmakers × [casa, fora, empate]).
+        
+        A coluna j de cada evento corresponde ao j-ésimo bookmaker da lista desse
+        evento, o que preserva o desempate pelo primeiro bookmaker com a melhor odd.
+        Preços em falta ficam a 0.
+        
+        Args:
+            games: Jogos devolvidos pela API
+        
+        Returns:
+            PriceMatrix com os eventos, os nomes dos bookmakers e os preços
+        """
+        events = [game for game in games if game.get("bookmakers")]
+        max_bookmakers = max((len(game["bookmakers"]) for game in events), default=0)
+        bookmakers = []
+        
+        # Recolher (posição no array, preço) numa única passagem pelo payload
+        positions, values = [], []
+        for e, game in enumerate(events):
+            # A equipa da casa tem prioridade se os nomes coincidirem
+            slots = {"Draw": DRAW, game["away_team"]: AWAY, game["home_team"]: HOME}
+            names = []
+            
+            for b, bookmaker in enumerate(game["bookmakers"]):
+                names.append(bookmaker["title"])
+                base = (e * max_bookmakers + b) * 3
+                for market in bookmaker["markets"]:
+                    if market["key"] != "h2h":
+                        continue
+                    for outcome in market["outcomes"]:
+                        slot = slots.get(outcome["name"])
+                        if slot is not None:
+                            positions.append(base + slot)
+                            values.append(outcome["price"])
+            
+            bookmakers.append(names)
+        
+        prices = np.zeros((len(events), max_bookmakers, 3))
+        if values:
+            # maximum.at resolve preços repetidos para a mesma posição
+            np.maximum.at(prices.reshape(-1), positions, np.asarray(values, dtype=float))
+        
+        return PriceMatrix(events, bookmakers, prices)
+    
+    @staticmethod
+    def pack_market(games: List[Dict[str, Any]], market_key: str) -> MarketMatrix:
+        """
+        Empacota um mercado qualquer com N resultados, identificados por (nome, point).
+        
+        Em mercados com linha (totals, spreads) cada linha do evento gera uma linha
+        da matriz; nos restantes (h2h, outrights) o evento inteiro é uma linha.
+        
+        Args:
+            games: Jogos devolvidos pela API
+            market_key: Chave do mercado (ex: 'totals', 'spreads', 'outrights')
+        
+        Returns:
+            MarketMatrix com as linhas, outcomes, bookmakers, preços e máscara
+        """
+        rows, row_outcomes, row_bookmakers = [], [], []
+        entries = []  # (linha, bookmaker, coluna, preço)
+        max_bookmakers = 0
+        
+        for game in games:
+            if not game.get("bookmakers"):
+                continue
+            
+            home_team = game.get("home_team")
+            line_rows: Dict[Optional[float], int] = {}
+            slots: Dict[int, Dict[Tuple[str, Optional[float]], int]] = {}
+            names = [bookmaker["title"] for bookmaker in game["bookmakers"]]
+            max_bookmakers = max(max_bookmakers, len(names))
+            
+            for b, bookmaker in enumerate(game["bookmakers"]):
+                for market in bookmaker["markets"]:
+                    if market["key"] != market_key:
+                        continue
+                    for outcome in market["outcomes"]:
+                        point = outcome.get("point")
+                        line = ArbitrageEngine._line_key(market_key, outcome["name"], point, home_team)
+                        
+                        r = line_rows.get(line)
+                        if r is None:
+                            r = line_rows[line] = len(rows)
+                            rows.append((game, line))
+                            row_outcomes.append([])
+                            row_bookmakers.append(names)
+                            slots[r] = {}
+                        
+                        key = (outcome["name"], point)
+                        k = slots[r].get(key)
+                        if k is None:
+                            k = slots[r][key] = len(row_outcomes[r])
+                            row_outcomes[r].append(key)
+                        
+                        entries.append((r, b, k, outcome["price"]))
+        
+        max_outcomes = max((len(outcomes) for outcomes in row_outcomes), default=0)
+        prices = np.zeros((len(rows), max_bookmakers, max_outcomes))
+        mask = np.zeros((len(rows), max_outcomes), dtype=bool)
+        for r, outcomes in enumerate(row_outcomes):
+            mask[r, :len(outcomes)] = True
+        
+        if entries:
+            r_idx, b_idx, k_idx, values = zip(*entries)
+            np.maximum.at(prices, (list(r_idx), list(b_idx), list(k_idx)), np.asarray(values, dtype=float))
+        
+        return MarketMatrix(rows, row_outcomes, row_bookmakers, prices, mask)
+    
+    @staticmethod
+    def _line_key(market_key: str, name: str, point: Optional[float], home_team: Optional[str]) -> Optional[float]:
+        """Agrupa os resultados que formam um mercado completo (ex: Over 2.5 com Under 2.5)."""
+        if market_key not in LINE_MARKETS or point is None:
+            return None
+        if "spreads" in market_key:
+            # Casa -1.5 complementa fora +1.5
+            return point if name == home_team else -point
+        return point
+    
+    @staticmethod
+    def evaluate(prices: np.ndarray, required: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Calcula em lote melhores odds, bookmakers, soma de probabilidades e lucro.
+        
+        Args:
+            prices: Array (linhas × bookmakers × outcomes) com 0 nos preços em falta
+            required: Máscara (outcomes,) ou (linhas × outcomes) dos resultados que
+                têm de ter preço; por omissão todos os outcomes
+        
+        Returns:
+            Dicionário de arrays: best_odds, best_index, implied_prob_sum,
+            is_arbitrage, profit_percent e valid (linhas com todos os resultados obrigatórios)
+        """
+        if prices.shape[1] == 0:
+            # Sem bookmakers: uma coluna vazia mantém as formas dos resultados
+            prices = np.zeros((prices.shape[0], 1, prices.shape[2]))
+        
+        best_index = prices.argmax(axis=1)
+        best_odds = np.take_along_axis(prices, best_index[:, np.newaxis, :], axis=1)[:, 0, :]
+        priced = best_odds > 0
+        
+        # Todos os resultados obrigatórios precisam de preço; os opcionais só contam quando existem
+        if required is None:
+            required = np.ones(prices.shape[2], dtype=bool)
+        valid = (priced | ~required).all(axis=1) & (priced.sum(axis=1) >= 2)
+        inverse = np.where(priced, 1 / np.where(priced, best_odds, 1), 0.0)
+        implied_prob_sum = inverse.sum(axis=1)
+        
+        is_arbitrage = valid & (implied_prob_sum < 1)
+        profit_percent = np.where(is_arbitrage, (1 / np.where(is_arbitrage, implied_prob_sum, 1) - 1) * 100, 0.0)
+        
+        return {
+            "best_odds": best_odds,
+            "best_index": best_index,
+            "implied_prob_sum": implied_prob_sum,
+            "is_arbitrage": is_arbitrage,
+            "profit_percent": profit_percent,
+            "valid": valid
+        }
+    
+    @staticmethod
+    def market_opportunities(games: List[Dict[str, Any]], market_key: str) -> List[Dict[str, Any]]:
+        """
+        Avalia a arbitragem de N resultados num mercado qualquer, numa só passagem.
+        
+        Os resultados são emparelhados por nome e point, sem assumir casa/fora/empate.
+        Mercados com linha só são avaliados quando a linha tem exatamente dois resultados.
+        
+        Args:
+            games: Jogos devolvidos pela API
+            market_key: Chave do mercado (ex: 'totals', 'spreads', 'outrights')
+        
+        Returns:
+            Lista de oportunidades ordenada por maior lucro potencial
+        """
+        matrix = ArbitrageEngine.pack_market(games, market_key)
+        result = ArbitrageEngine.evaluate(matrix.prices, required=matrix.mask)
+        
+        valid = result["valid"]
+        if market_key in LINE_MARKETS:
+            valid = valid & (matrix.mask.sum(axis=1) == 2)
+        
+        best_odds = result["best_odds"].tolist()
+        best_index = result["best_index"].tolist()
+        implied_prob_sum = result["implied_prob_sum"].tolist()
+        is_arbitrage = result["is_arbitrage"].tolist()
+        profit_percent = result["profit_percent"].tolist()
+        
+        order = np.argsort(-result["profit_percent"], kind="stable")
+        
+        arb_opportunities = []
+        for r in order[valid[order]].tolist():
+            game, line = matrix.rows[r]
+            names = matrix.bookmakers[r]
+            outcomes = [
+                {
+                    "name": name,
+                    "point": point,
+                    "odd": best_odds[r][k],
+                    "bookmaker": names[best_index[r][k]]
+                }
+                for k, (name, point) in enumerate(matrix.outcomes[r])
+            ]
+            
+            arb_opportunities.append({
+                "id": game["id"],
+                "sport": game["sport_key"],
+                "commence_time": game["commence_time"],
+                "home_team": game.get("home_team"),
+                "away_team": game.get("away_team"),
+                "market": market_key,
+                "line": line,
+                "has_draw": any(outcome["name"] == "Draw" for outcome in outcomes),
+                "outcomes": outcomes,
+                "implied_prob_sum": implied_prob_sum[r],
+                "is_arbitrage": is_arbitrage[r],
+                "profit_percent": profit_percent[r]
+            })
+        
+        return arb_opportunities
+    
+    @staticmethod
+    def h2h_opportunities(games: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Encontra as melhores odds h2h de cada jogo e avalia a arbitragem.
+        
+        Devolve os mesmos dicionários que OddsAPI.get_best_odds, ordenados por
+        maior lucro potencial. Jogos sem odds de casa ou fora são ignorados.
+        
+        Args:
+            games: Jogos devolvidos pela API
+        
+        Returns:
+            Lista de jogos com odds otimizadas para arbitragem
+        """
+        matrix = ArbitrageEngine.pack_h2h(games)
+        result = ArbitrageEngine.evaluate(matrix.prices, required=H2H_REQUIRED)
+        
+        best_odds = result["best_odds"].tolist()
+        best_index = result["best_index"].tolist()
+        implied_prob_sum = result["implied_prob_sum"].tolist()
+        is_arbitrage = result["is_arbitrage"].tolist()
+        profit_percent = result["profit_percent"].tolist()
+        valid = result["valid"]
+        
+        # Ordenação estável por maior lucro, como no sort original
+        order = np.argsort(-result["profit_percent"], kind="stable")
+        
+        arb_opportunities = []
+        for e in order[valid[order]].tolist():
+            game = matrix.events[e]
+            names = matrix.bookmakers[e]
+            odds = best_odds[e]
+            index = best_index[e]
+            home_team = game["home_team"]
+            away_team = game["away_team"]
+            has_draw = odds[DRAW] > 0
+            
+            outcomes = [
+                {"name": home_team, "odd": odds[HOME], "bookmaker": names[index[HOME]]},
+                {"name": away_team, "odd": odds[AWAY], "bookmaker": names[index[AWAY]]}
+            ]
+            if has_draw:
+                outcomes.append({"name": "Empate", "odd": odds[DRAW], "bookmaker": names[index[DRAW]]})
+            
+            arb_opportunities.append({
+                "id": game["id"],
+                "sport": game["sport_key"],
+                "commence_time": game["commence_time"],
+                "home_team": home_team,
+                "away_team": away_team,
+                "market": "h2h",
+                "line": None,
+                "has_draw": has_draw,
+                "outcomes": outcomes,
+                "implied_prob_sum": implied_prob_sum[e],
+                "is_arbitrage": is_arbitrage[e],
+                "profit_percent": profit_percent[e]
+            })
+        
+        return arb_opportunities
+    
+    @staticmethod
+    def top_combinations(game: Dict[str, Any], market_key: str = "h2h", k: int = 5,
+                         min_profit: float = 0.0, line: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Enumera as k combinações de bookmakers mais lucrativas de um evento.
+        
+        Em cada resultado os preços são ordenados do maior para o menor, por isso
+        avançar um índice nunca diminui a soma das probabilidades implícitas. Um heap
+        parte da combinação das melhores odds e só gera sucessores das combinações
+        retiradas; a enumeração termina assim que o lucro desce abaixo de min_profit,
+        sem percorrer o produto cartesiano.
+        
+        Args:
+            game: Jogo devolvido pela API
+            market_key: Chave do mercado
+            k: Número máximo de combinações
+            min_profit: Lucro mínimo (%) de uma combinação
+            line: Em mercados com linha, considerar apenas esta linha (por omissão todas)
+        
+        Returns:
+            Combinações no formato das oportunidades, da mais lucrativa para a menos
+        """
+        matrix = ArbitrageEngine.pack_market([game], market_key)
+        max_sum = 1 / (1 + min_profit / 100)
+        
+        # Por linha do mercado: lista de (preço, índice do bookmaker) por resultado, ordenada
+        candidates = []
+        heap = []
+        for r, outcomes in enumerate(matrix.outcomes):
+            if market_key in LINE_MARKETS and len(outcomes) != 2:
+                continue
+            if line is not None and matrix.rows[r][1] != line:
+                continue
+            if market_key == "h2h" and len(outcomes) < 2:
+                continue
+            ranked = []
+            for column in range(len(outcomes)):
+                prices = matrix.prices[r, :, column]
+                order = np.argsort(-prices, kind="stable")
+                ranked.append([(float(prices[b]), int(b)) for b in order if prices[b] > 0])
+            if not all(ranked):
+                continue
+            
+            inverse = sum(1 / prices[0][0] for prices in ranked)
+            if inverse < max_sum:
+                heapq.heappush(heap, (inverse, len(candidates), (0,) * len(ranked), 0))
+            candidates.append((r, ranked))
+        
+        combinations = []
+        while heap and len(combinations) < k:
+            inverse, c, indices, first = heapq.heappop(heap)
+            r, ranked = candidates[c]
+            combinations.append((inverse, r, ranked, indices))
+            
+            # Sucessores: avançar uma posição >= à última avançada gera cada combinação uma só vez
+            for position in range(first, len(indices)):
+                following = indices[position] + 1
+                if following >= len(ranked[position]):
+                    continue
+                next_inverse = (inverse - 1 / ranked[position][indices[position]][0]
+                                + 1 / ranked[position][following][0])
+                if next_inverse >= max_sum:
+                    continue
+                next_indices = indices[:position] + (following,) + indices[position + 1:]
+                heapq.heappush(heap, (next_inverse, c, next_indices, position))
+        
+        result = []
+        for inverse, r, ranked, indices in combinations:
+            game, line = matrix.rows[r]
+            names = matrix.bookmakers[r]
+            outcomes = []
+            for (name, point), prices, i in zip(matrix.outcomes[r], ranked, indices):
+                price, b = prices[i]
+                if market_key == "h2h" and name == "Draw":
+                    name = "Empate"
+                outcomes.append({"name": name, "point": point, "odd": price, "bookmaker": names[b]})
+            
+            result.append({
+                "id": game["id"],
+                "sport": game["sport_key"],
+                "commence_time": game["commence_time"],
+                "home_team": game.get("home_team"),
+                "away_team": game.get("away_team"),
+                "market": market_key,
+                "line": line,
+                "has_draw": any(outcome["name"] == "Empate" for outcome in outcomes),
+                "outcomes": outcomes,
+                "implied_prob_sum": inverse,
+                "is_arbitrage": inverse < 1,
+                "profit_percent": (1 / inverse - 1) * 100
+            })
+        return result
+
+
+class IncrementalArbitrageEngine:
+    """
+    Mantém o estado de melhores preços por evento e reavalia só o que mudou.
+    
+    Cada chamada a apply recebe o payload completo de um esporte/mercado, mas só
+    os bookmakers cujo last_update mudou alteram o estado, e só os eventos tocados
+    são recalculados, todos juntos numa única passagem vetorizada do ArbitrageEngine.
+    O ranking por profit_percent é uma lista ordenada: as entradas dos eventos
+    tocados saem e as novas são intercaladas (merge), sem reordenar a lista inteira.
+    """
+    
+    def __init__(self, market_key: str = "h2h"):
+        """
+        Inicializa o motor incremental.
+        
+        Args:
+            market_key: Mercado avaliado ('h2h' ou qualquer mercado de ArbitrageEngine.market_opportunities)
+        """
+        self.market_key = market_key
+        self._lock = threading.Lock()
+        self._events: Dict[str, Dict[str, Any]] = {}
+        self._ranking: List[Tuple[float, int, int, str]] = []
+        self._sequence = 0
+        self.last_touched: List[str] = []
+    
+    def apply(self, games: List[Dict[str, Any]], complete: bool = True) -> List[str]:
+        """
+        Aplica um payload da API ao estado e recalcula os eventos alterados.
+        
+        Args:
+            games: Jogos devolvidos pela API
+            complete: Se True, o payload é a lista completa e eventos ausentes são removidos
+        
+        Returns:
+            IDs dos eventos recalculados ou removidos
+        """
+        with self._lock:
+            touched = set()
+            seen = set()
+            
+            for game in games:
+                event_id = game["id"]
+                seen.add(event_id)
+                state = self._events.get(event_id)
+                if state is None:
+                    state = self._events[event_id] = {
+                        "order": self._sequence,
+                        "game": game,
+                        "bookmakers": {},
+                        "opportunities": [],
+                        "signature": None
+                    }
+                    self._sequence += 1
+                
+                # Mesmos bookmakers com o mesmo last_update: nada a comparar
+                signature = tuple((bookmaker["title"], bookmaker.get("last_update"))
+                                  for bookmaker in game.get("bookmakers") or [])
+                if state["signature"] is not None and state["signature"] == signature:
+                    continue
+                
+                if self._merge_bookmakers(state, game):
+                    state["game"] = game
+                    touched.add(event_id)
+                # Sem last_update não é possível confiar na assinatura
+                state["signature"] = signature if all(update is not None for _, update in signature) else None
+            
+            if complete:
+                for event_id in [event_id for event_id in self._events if event_id not in seen]:
+                    del self._events[event_id]
+                    touched.add(event_id)
+            
+            self._recalculate(touched)
+            self.last_touched = sorted(touched)
+            return self.last_touched
+    
+    def opportunities(self, min_profit: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Devolve as oportunidades pela ordem do ranking (maior lucro primeiro).
+        
+        Args:
+            min_profit: Se definido, apenas arbitragens com pelo menos este lucro
+            limit: Número máximo de oportunidades devolvidas
+        
+        Returns:
+            Lista de oportunidades
+        """
+        with self._lock:
+            result = []
+            for neg_profit, _, index, event_id in self._ranking:
+                if min_profit is not None and -neg_profit < min_profit:
+                    break
+                opportunity = self._events[event_id]["opportunities"][index]
+                if min_profit is not None and not opportunity["is_arbitrage"]:
+                    continue
+                result.append(opportunity)
+                if limit is not None and len(result) >= limit:
+                    break
+            return result
+    
+    def top_combinations(self, event_id: str, k: int = 5, min_profit: float = 0.0,
+                         line: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Enumera as k combinações de bookmakers mais lucrativas de um evento conhecido.
+        
+        Args:
+            event_id: ID do evento
+            k: Número máximo de combinações
+            min_profit: Lucro mínimo (%) de uma combinação
+            line: Linha do mercado a considerar (por omissão todas)
+        
+        Returns:
+            Combinações (ver ArbitrageEngine.top_combinations), ou lista vazia se o evento não existir
+        """
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                return []
+            game = dict(state["game"])
+            game["bookmakers"] = list(state["bookmakers"].values())
+        return ArbitrageEngine.top_combinations(game, self.market_key, k=k, min_profit=min_profit, line=line)
+    
+    def next_commence_time(self) -> Optional[str]:
+        """
+        Devolve o commence_time mais cedo entre os eventos conhecidos.
+        
+        Eventos a decorrer continuam na lista da API, por isso um valor no passado
+        significa que há pelo menos um jogo em curso.
+        
+        Returns:
+            commence_time ISO 8601 do evento mais cedo, ou None se não houver eventos
+        """
+        with self._lock:
+            return min((state["game"]["commence_time"] for state in self._events.values()
+                        if state["game"].get("commence_time")), default=None)
+    
+    def _merge_bookmakers(self, state: Dict[str, Any], game: Dict[str, Any]) -> bool:
+        """Guarda os bookmakers com last_update novo e devolve True se algo mudou."""
+        changed = False
+        current = state["bookmakers"]
+        titles = []
+        
+        for bookmaker in game.get("bookmakers") or []:
+            title = bookmaker["title"]
+            titles.append(title)
+            previous = current.get(title)
+            last_update = bookmaker.get("last_update")
+            if previous is not None and last_update is not None and previous.get("last_update") == last_update:
+                continue
+            if previous != bookmaker:
+                current[title] = bookmaker
+                changed = True
+        
+        # Bookmakers que deixaram de oferecer o evento
+        for title in [title for title in current if title not in titles]:
+            del current[title]
+            changed = True
+        
+        # Manter a ordem do payload para o desempate pelo primeiro bookmaker
+        if list(current) != titles:
+            state["bookmakers"] = {title: current[title] for title in titles}
+        
+        return changed
+    
+    def _recalculate(self, touched: set) -> None:
+        """Recalcula numa só passagem os eventos tocados e atualiza o ranking."""
+        if not touched:
+            return
+        
+        states = [self._events[event_id] for event_id in touched if event_id in self._events]
+        games = []
+        for state in states:
+            game = dict(state["game"])
+            game["bookmakers"] = list(state["bookmakers"].values())
+            games.append(game)
+        
+        if not games:
+            opportunities = []
+        elif self.market_key == "h2h":
+            opportunities = ArbitrageEngine.h2h_opportunities(games)
+        else:
+            opportunities = ArbitrageEngine.market_opportunities(games, self.market_key)
+        
+        # Agrupar por evento mantendo a ordem por lucro dentro de cada evento
+        by_event: Dict[str, List[Dict[str, Any]]] = {}
+        for opportunity in opportunities:
+            by_event.setdefault(opportunity["id"], []).append(opportunity)
+        
+        new_keys = []
+        for state in states:
+            event_id = state["game"]["id"]
+            state["opportunities"] = by_event.get(event_id, [])
+            new_keys.extend(
+                (-opportunity["profit_percent"], state["order"], index, event_id)
+                for index, opportunity in enumerate(state["opportunities"])
+            )
+        new_keys.sort()
+        
+        kept = [key for key in self._ranking if key[3] not in touched]
+        self._ranking = list(heapq.merge(kept, new_keys))
@@ -2,6 +2,7 @@
 Helpers específicos para casas de apostas populares em Portugal
 """
 import re
+import numpy as np
 from typing import Dict, List, Tuple, Optional
 from security_utils import SecurityUtils
 
@@ -90,56 +91,206 @@ class BookmakerHelpers:
         Returns:
             Dicionário com informações detalhadas das apostas
         """
-        # Obter informações das casas de apostas
-        bm1_info = BookmakerHelpers.get_bookmaker_info(bookmaker1)
-        bm2_info = BookmakerHelpers.get_bookmaker_info(bookmaker2)
+        result = BookmakerHelpers.calculate_optimal_stakes_n(
+            [odd1, odd2], total_stake, [bookmaker1, bookmaker2]
+        )
         
-        # Calcular apostas ótimas básicas
-        implied_prob1 = 1 / odd1
-        implied_prob2 = 1 / odd2
-        total_implied = implied_prob1 + implied_prob2
+        return {
+            "stake1": result["stakes"][0],
+            "stake2": result["stakes"][1],
+            "total_adjusted": result["total_adjusted"],
+            "guaranteed_profit": result["guaranteed_profit"],
+            "profit_percent": result["profit_percent"],
+            "warnings": result["warnings"],
+            "bm1_info": result["bookmaker_info"][0],
+            "bm2_info": result["bookmaker_info"][1],
+            "is_profitable": result["is_profitable"]
+        }
+    
+    @staticmethod
+    def calculate_optimal_stakes_n(odds: List[float], total_stake: float,
+                                   bookmakers: List[Optional[str]]) -> Dict:
+        """
+        Calcula apostas ótimas para N resultados considerando limites das casas de apostas.
         
-        optimal_stake1 = total_stake * implied_prob1 / total_implied
-        optimal_stake2 = total_stake * implied_prob2 / total_implied
+        Args:
+            odds: Odds de cada resultado
+            total_stake: Montante total disponível
+            bookmakers: Casa de apostas de cada resultado (None se desconhecida)
+            
+        Returns:
+            Dicionário com stakes, lucro garantido, avisos e informações das casas
+        """
+        # Obter informações das casas de apostas
+        bm_infos = [
+            BookmakerHelpers.get_bookmaker_info(bookmaker) if bookmaker else None
+            for bookmaker in bookmakers
+        ]
+        min_bets = [bm_info["min_bet"] if bm_info else 0.0 for bm_info in bm_infos]
+        max_bets = [bm_info["max_bet"] if bm_info else np.inf for bm_info in bm_infos]
+        
+        result = BookmakerHelpers.optimize_stakes([odds], total_stake, [min_bets], [max_bets])
+        stakes = result["stakes"][0].tolist()
         
-        # Aplicar limites das casas de apostas
         warnings = []
+        if not result["feasible"][0]:
+            warnings.append(f"Os mínimos das casas de apostas (€{sum(min_bets):.2f}) excedem o montante disponível")
+        for i, bm_info in enumerate(bm_infos):
+            if not bm_info:
+                continue
+            if result["at_min"][0, i]:
+                warnings.append(f"Aposta na {bm_info['name']} fixada no mínimo (€{bm_info['min_bet']:.2f})")
+            if result["at_max"][0, i]:
+                warnings.append(f"Aposta na {bm_info['name']} limitada ao máximo (€{bm_info['max_bet']:.2f}) - montante total reduzido")
         
-        if bm1_info:
-            if optimal_stake1 < bm1_info["min_bet"]:
-                warnings.append(f"Aposta na {bm1_info['name']} é inferior ao mínimo (€{bm1_info['min_bet']:.2f})")
-                optimal_stake1 = bm1_info["min_bet"]
-            elif optimal_stake1 > bm1_info["max_bet"]:
-                warnings.append(f"Aposta na {bm1_info['name']} excede o máximo (€{bm1_info['max_bet']:.2f})")
-                optimal_stake1 = bm1_info["max_bet"]
-        
-        if bm2_info:
-            if optimal_stake2 < bm2_info["min_bet"]:
-                warnings.append(f"Aposta na {bm2_info['name']} é inferior ao mínimo (€{bm2_info['min_bet']:.2f})")
-                optimal_stake2 = bm2_info["min_bet"]
-            elif optimal_stake2 > bm2_info["max_bet"]:
-                warnings.append(f"Aposta na {bm2_info['name']} excede o máximo (€{bm2_info['max_bet']:.2f})")
-                optimal_stake2 = bm2_info["max_bet"]
-        
-        # Recalcular lucro com os ajustes
-        adjusted_total = optimal_stake1 + optimal_stake2
-        profit1 = (optimal_stake1 * odd1) - adjusted_total
-        profit2 = (optimal_stake2 * odd2) - adjusted_total
-        guaranteed_profit = min(profit1, profit2)
+        adjusted_total = float(result["total"][0])
+        guaranteed_profit = float(result["profit"][0])
         profit_percent = (guaranteed_profit / adjusted_total) * 100 if adjusted_total > 0 else 0
         
         return {
-            "stake1": optimal_stake1,
-            "stake2": optimal_stake2,
+            "stakes": stakes,
             "total_adjusted": adjusted_total,
             "guaranteed_profit": guaranteed_profit,
             "profit_percent": profit_percent,
             "warnings": warnings,
-            "bm1_info": bm1_info,
-            "bm2_info": bm2_info,
+            "bookmaker_info": bm_infos,
             "is_profitable": guaranteed_profit > 0
         }
     
+    @staticmethod
+    def optimize_stakes(odds, budget, min_bets=None, max_bets=None, unit: float = 0.01) -> Dict[str, np.ndarray]:
+        """
+        Maximiza o lucro garantido sob limites mínimos/máximos, orçamento e arredondamento, em lote.
+        
+        Para um retorno garantido R, a aposta ótima em cada resultado é
+        max(R/odd, min_bet): nunca se aposta mais do que o necessário para pagar R.
+        O custo g(R) = Σ max(R/odd, min_bet) é linear por troços com quebras em
+        min_bet·odd, por isso o maior R dentro do orçamento obtém-se em forma fechada
+        (water-filling) e é limitado por min(max_bet·odd). Com arbitragem o lucro
+        R - g(R) cresce com R, logo esse R é o ótimo; sem arbitragem o orçamento é
+        igualmente distribuído para mostrar a perda. Com arbitragem as apostas são
+        levadas ao cêntimo por _round_stakes, que procura o melhor lucro garantido
+        já arredondado; sem arbitragem são arredondadas para baixo.
+        
+        Args:
+            odds: Array (oportunidades × resultados); NaN nos resultados inexistentes
+            budget: Montante disponível (escalar ou um por oportunidade)
+            min_bets: Apostas mínimas por resultado (por omissão 0)
+            max_bets: Apostas máximas por resultado (por omissão sem limite)
+            unit: Unidade de arredondamento das apostas
+        
+        Returns:
+            Dicionário de arrays: stakes, payout (retorno garantido), total, profit,
+            feasible (mínimos cabem no orçamento e nos máximos), at_min e at_max (apostas presas aos limites)
+        """
+        odds = np.atleast_2d(np.asarray(odds, dtype=float))
+        present = np.isfinite(odds) & (odds > 0)
+        odds = np.where(present, odds, 1.0)
+        min_bets = np.where(present, 0.0 if min_bets is None else np.asarray(min_bets, dtype=float), 0.0)
+        max_bets = np.where(present, np.inf if max_bets is None else np.asarray(max_bets, dtype=float), np.inf)
+        budget = np.broadcast_to(np.asarray(budget, dtype=float), odds.shape[:1])
+        
+        inverse = np.where(present, 1 / odds, 0.0)
+        total_min = min_bets.sum(axis=1)
+        feasible = (total_min <= budget + 1e-9) & (min_bets <= max_bets).all(axis=1)
+        
+        # Quebras de g(R): acima de min_bet·odd o resultado passa a acompanhar R
+        breakpoints = np.where(present, min_bets * odds, np.inf)
+        order = np.argsort(breakpoints, axis=1)
+        sorted_breaks = np.take_along_axis(breakpoints, order, axis=1)
+        free_inverse = np.cumsum(np.take_along_axis(inverse, order, axis=1), axis=1)
+        fixed_min = total_min[:, np.newaxis] - np.cumsum(np.take_along_axis(min_bets, order, axis=1), axis=1)
+        finite = np.isfinite(sorted_breaks)
+        cost_at_break = np.where(finite, np.where(finite, sorted_breaks, 0.0) * free_inverse + fixed_min, np.inf)
+        
+        # Último troço cujo início cabe no orçamento; aí g(R) = R·free_inverse + fixed_min
+        segment = np.maximum((cost_at_break <= budget[:, np.newaxis] + 1e-9).sum(axis=1) - 1, 0)
+        rows = np.arange(odds.shape[0])
+        slope = free_inverse[rows, segment]
+        payout = (budget - fixed_min[rows, segment]) / np.where(slope > 0, slope, 1)
+        payout = np.minimum(payout, np.where(present, max_bets * odds, np.inf).min(axis=1))
+        payout = np.where(feasible, np.maximum(payout, 0.0), 0.0)
+        
+        continuous = np.where(present, np.minimum(np.maximum(payout[:, np.newaxis] * inverse, min_bets), max_bets), 0.0)
+        stakes = np.floor(continuous / unit + 1e-9) * unit
+        
+        # Arredondar para baixo pode deixar um resultado sem cobrir o total apostado
+        arbitrage = feasible & (payout - continuous.sum(axis=1) > 0)
+        if arbitrage.any():
+            stakes[arbitrage] = BookmakerHelpers._round_stakes(
+                continuous[arbitrage], odds[arbitrage], present[arbitrage], min_bets[arbitrage],
+                max_bets[arbitrage], budget[arbitrage], stakes[arbitrage], unit
+            )
+        stakes = np.where(present & feasible[:, np.newaxis], stakes, 0.0)
+        
+        total = stakes.sum(axis=1)
+        returns = np.where(present, stakes * odds, np.inf)
+        guaranteed = np.where(feasible & present.any(axis=1), returns.min(axis=1), 0.0)
+        
+        return {
+            "stakes": stakes,
+            "payout": guaranteed,
+            "total": total,
+            "profit": guaranteed - total,
+            "feasible": feasible,
+            "at_min": present & (min_bets > 0) & (stakes <= min_bets + 1e-9) & feasible[:, np.newaxis],
+            "at_max": present & np.isfinite(max_bets) & (stakes >= max_bets - unit) & feasible[:, np.newaxis]
+        }
+    
+    @staticmethod
+    def _round_stakes(continuous, odds, present, min_bets, max_bets, budget, fallback, unit: float,
+                      window: Optional[int] = None) -> np.ndarray:
+        """
+        Leva as apostas ao cêntimo maximizando o lucro garantido já arredondado.
+        
+        No ótimo em cêntimos há um resultado j que fixa o retorno R = s_j·odd_j; os
+        restantes recebem a menor aposta em cêntimos que ainda paga R (e o mínimo da
+        casa). Procuram-se s_j numa janela de cêntimos à volta da solução contínua,
+        para cada j, e fica o candidato com maior lucro dentro do orçamento e dos máximos.
+        
+        Args:
+            continuous: Apostas contínuas (linhas × resultados)
+            odds, present, min_bets, max_bets: Como em optimize_stakes, já normalizados
+            budget: Orçamento por linha
+            fallback: Apostas usadas nas linhas sem candidato válido
+            unit: Unidade de arredondamento
+            window: Cêntimos abaixo da solução contínua a considerar (por omissão 2·resultados + 2)
+        
+        Returns:
+            Apostas arredondadas (linhas × resultados)
+        """
+        n = odds.shape[1]
+        if window is None:
+            window = 2 * n + 2
+        steps = np.arange(-window, 2)
+        
+        # Candidatos para a aposta do resultado que fixa o retorno: (linhas × j × passos)
+        binding = np.floor(continuous / unit + 1e-9)[:, :, np.newaxis] + steps
+        target = binding * unit * odds[:, :, np.newaxis]
+        
+        # Menor aposta de cada resultado i que paga o retorno alvo: (linhas × j × passos × i)
+        units = np.ceil(target[..., np.newaxis] / odds[:, np.newaxis, np.newaxis, :] / unit - 1e-9)
+        units = np.maximum(units, np.ceil(min_bets / unit - 1e-9)[:, np.newaxis, np.newaxis, :])
+        units = np.where(np.eye(n, dtype=bool)[np.newaxis, :, np.newaxis, :], binding[..., np.newaxis], units)
+        candidates = np.where(present[:, np.newaxis, np.newaxis, :], units * unit, 0.0)
+        
+        total = candidates.sum(axis=-1)
+        returns = np.where(present[:, np.newaxis, np.newaxis, :],
+                           candidates * odds[:, np.newaxis, np.newaxis, :], np.inf).min(axis=-1)
+        valid = (
+            present[:, :, np.newaxis] & (binding > 0)
+            & (candidates >= np.where(present, min_bets, 0.0)[:, np.newaxis, np.newaxis, :] - 1e-9).all(axis=-1)
+            & (candidates <= max_bets[:, np.newaxis, np.newaxis, :] + 1e-9).all(axis=-1)
+            & (total <= budget[:, np.newaxis, np.newaxis] + 1e-9)
+        )
+        
+        # Maior lucro; em caso de empate, o maior retorno
+        score = np.where(valid, (returns - total) + 1e-9 * returns, -np.inf).reshape(len(odds), -1)
+        best = score.argmax(axis=1)
+        rows = np.arange(len(odds))
+        rounded = candidates.reshape(len(odds), -1, n)[rows, best]
+        return np.where(np.isfinite(score[rows, best])[:, np.newaxis], rounded, fallback)
+    
     @staticmethod
     def get_betting_tips(bookmaker1: str, bookmaker2: str) -> List[str]:
         """
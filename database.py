@@ -1,25 +1,148 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+import psycopg2.sql
 from datetime import datetime
 
-def get_connection():
-    """Estabelece uma conexão com o banco de dados PostgreSQL."""
+# Configuração do pool de ligações (partilhado por todo o processo)
+POOL_MIN_CONNECTIONS = int(os.environ.get("DB_POOL_MIN", 1))
+POOL_MAX_CONNECTIONS = int(os.environ.get("DB_POOL_MAX", 10))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+# Ligações paradas há mais tempo do que isto são verificadas com SELECT 1 antes de serem entregues
+POOL_HEALTH_CHECK_AFTER = float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+_last_used = {}
+# Ligações emprestadas (por id): cada empréstimo devolve a sua vaga do pool uma única vez
+_checked_out = set()
+
+def _get_pool():
+    """Cria o pool de ligações na primeira utilização."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Usar variável de ambiente para a URL do banco de dados
+            db_url = os.environ.get("DATABASE_URL")
+            if not db_url:
+                raise ValueError("DATABASE_URL não encontrada nas variáveis de ambiente")
+            
+            # Ligações com SSL obrigatório
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, db_url, sslmode='require'
+            )
+        return _pool
+
+def _is_healthy(conn):
+    """Verifica se uma ligação do pool ainda está utilizável."""
+    if conn.closed:
+        return False
+    
+    last_used = _last_used.get(id(conn), 0)
+    if time.time() - last_used < POOL_HEALTH_CHECK_AFTER:
+        return True
+    
     try:
-        # Usar variável de ambiente para a URL do banco de dados
-        db_url = os.environ.get("DATABASE_URL")
-        if not db_url:
-            raise ValueError("DATABASE_URL não encontrada nas variáveis de ambiente")
-        
-        # Conectar ao banco de dados com SSL obrigatório
-        conn = psycopg2.connect(db_url, sslmode='require')
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+        cursor.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def get_connection(timeout=None):
+    """
+    Obtém uma ligação do pool de ligações PostgreSQL.
+    
+    A ligação deve ser devolvida com release_connection (ou usar o context
+    manager connection()). Se todas as ligações estiverem ocupadas, espera até
+    timeout segundos (por omissão DB_POOL_TIMEOUT) antes de desistir.
+    """
+    if timeout is None:
+        timeout = POOL_ACQUIRE_TIMEOUT
+    
+    if not _pool_slots.acquire(timeout=timeout):
+        print("Erro de conexão com o banco de dados: pool de ligações esgotado")
+        return None
+    
+    try:
+        pool = _get_pool()
+        conn = pool.getconn()
+        # Substituir ligações quebradas (ex: servidor reiniciado) por novas
+        for _ in range(POOL_MAX_CONNECTIONS):
+            if _is_healthy(conn):
+                break
+            pool.putconn(conn, close=True)
+            _last_used.pop(id(conn), None)
+            conn = pool.getconn()
+        with _pool_lock:
+            _checked_out.add(id(conn))
         return conn
     except Exception as e:
+        _pool_slots.release()
         print(f"Erro de conexão com o banco de dados: {e}")
         return None
 
+def release_connection(conn, discard=False):
+    """
+    Devolve uma ligação ao pool.
+    
+    Transações deixadas em aberto são revertidas; ligações fechadas ou
+    marcadas com discard=True são descartadas. Devolver a mesma ligação
+    duas vezes não tem efeito.
+    """
+    if conn is None:
+        return
+    
+    with _pool_lock:
+        if id(conn) not in _checked_out:
+            return
+        _checked_out.discard(id(conn))
+    
+    try:
+        close = discard or conn.closed
+        if not close and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                close = True
+        
+        if close:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.time()
+        _get_pool().putconn(conn, close=close)
+    except Exception as e:
+        print(f"Erro ao devolver ligação ao pool: {e}")
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def connection():
+    """Context manager que empresta uma ligação do pool (None se indisponível)."""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
+def close_pool():
+    """Fecha todas as ligações do pool (ex: no fim do processo)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
 def save_arbitrage_opportunity(odd1, odd2, total_stake, stake1, stake2, profit, profit_percent, 
-                             event_name=None, bookmaker1=None, bookmaker2=None):
+                             event_name=None, bookmaker1=None, bookmaker2=None, user_id=None):
     """
     Salva uma oportunidade de arbitragem no banco de dados.
     
@@ -31,6 +154,7 @@ def save_arbitrage_opportunity(odd1, odd2, total_stake, stake1, stake2, profit,
     - profit_percent: Percentagem de lucro
     - event_name: Nome do evento (opcional)
     - bookmaker1, bookmaker2: Nomes das casas de apostas (opcional)
+    - user_id: Utilizador que guardou a oportunidade (opcional)
     """
     conn = get_connection()
     if conn is None:
@@ -39,101 +163,186 @@ def save_arbitrage_opportunity(odd1, odd2, total_stake, stake1, stake2, profit,
     try:
         cursor = conn.cursor()
         
-        # Verificar se a tabela tem as colunas adicionais
-        try:
-            # Verificar se as colunas existem
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = 'arbitrage_opportunities' 
-                AND column_name IN ('event_name', 'bookmaker1', 'bookmaker2');
-            """)
-            existing_columns = [row[0] for row in cursor.fetchall()]
-            
-            # Se as colunas não existirem, adicioná-las
-            if 'event_name' not in existing_columns:
-                cursor.execute("ALTER TABLE arbitrage_opportunities ADD COLUMN event_name TEXT;")
-            if 'bookmaker1' not in existing_columns:
-                cursor.execute("ALTER TABLE arbitrage_opportunities ADD COLUMN bookmaker1 TEXT;")
-            if 'bookmaker2' not in existing_columns:
-                cursor.execute("ALTER TABLE arbitrage_opportunities ADD COLUMN bookmaker2 TEXT;")
-            
-            conn.commit()
-        except Exception as e:
-            print(f"Erro ao verificar/adicionar colunas: {e}")
-            # Continuar mesmo se houver erro (usar colunas existentes)
-            conn.rollback()
-        
-        # Inserir os dados com as colunas adicionais, se disponíveis
+        # As colunas adicionais são garantidas pelas migrações (migrations.py)
         query = """
             INSERT INTO arbitrage_opportunities 
-            (odd1, odd2, total_stake, stake1, stake2, profit, profit_percent, event_name, bookmaker1, bookmaker2) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            (odd1, odd2, total_stake, stake1, stake2, profit, profit_percent, event_name, bookmaker1, bookmaker2, user_id) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id;
         """
         cursor.execute(query, (
             odd1, odd2, total_stake, stake1, stake2, profit, profit_percent,
-            event_name, bookmaker1, bookmaker2
+            event_name, bookmaker1, bookmaker2, user_id
         ))
         result = cursor.fetchone()
         opportunity_id = result[0] if result else None
         conn.commit()
         cursor.close()
-        conn.close()
+        release_connection(conn)
+        conn = None
         return opportunity_id
     except Exception as e:
         print(f"Erro ao salvar oportunidade de arbitragem: {e}")
         if conn:
-            conn.close()
+            release_connection(conn)
         return False
 
-def get_arbitrage_history(limit=10):
-    """Recupera o histórico de oportunidades de arbitragem."""
+def _opportunity_row(opportunity):
+    """Converte um dicionário de oportunidade nos valores de uma linha da tabela."""
+    outcomes = opportunity.get('outcomes')
+    if outcomes:
+        outcomes = [dict(outcome) for outcome in outcomes]
+        first, second = outcomes[0], outcomes[1] if len(outcomes) > 1 else {}
+        defaults = {
+            'odd1': first.get('odd'), 'odd2': second.get('odd'),
+            'stake1': first.get('stake'), 'stake2': second.get('stake'),
+            'bookmaker1': first.get('bookmaker'), 'bookmaker2': second.get('bookmaker'),
+        }
+    else:
+        defaults = {}
+    
+    def value(field):
+        return opportunity.get(field, defaults.get(field))
+    
+    return (
+        value('odd1'), value('odd2'), opportunity['total_stake'],
+        value('stake1'), value('stake2'), opportunity['profit'], opportunity['profit_percent'],
+        opportunity.get('event_name'), value('bookmaker1'), value('bookmaker2'),
+        psycopg2.extras.Json(outcomes) if outcomes else None,
+        opportunity.get('user_id')
+    )
+
+def save_arbitrage_opportunities(opportunities):
+    """
+    Salva várias oportunidades de arbitragem numa única transacção.
+    
+    Parâmetros:
+    - opportunities: Lista de dicionários com total_stake, profit, profit_percent e,
+      opcionalmente, event_name e user_id. Os resultados vêm em 'outcomes' (lista de dicionários
+      com name, odd, stake e bookmaker) para mercados com N resultados, ou nos campos
+      odd1/odd2/stake1/stake2/bookmaker1/bookmaker2. Sem esses campos, são preenchidos
+      a partir dos dois primeiros resultados.
+    
+    Retorna a lista de ids atribuídos, pela ordem recebida, ou None em caso de erro.
+    """
+    if not opportunities:
+        return []
+    
+    conn = get_connection()
+    if conn is None:
+        return None
+    
+    try:
+        rows = [_opportunity_row(opportunity) for opportunity in opportunities]
+        cursor = conn.cursor()
+        query = """
+            INSERT INTO arbitrage_opportunities
+            (odd1, odd2, total_stake, stake1, stake2, profit, profit_percent,
+             event_name, bookmaker1, bookmaker2, outcomes, user_id)
+            VALUES %s
+            RETURNING id;
+        """
+        results = psycopg2.extras.execute_values(
+            cursor, query, rows, page_size=len(rows), fetch=True
+        )
+        conn.commit()
+        cursor.close()
+        release_connection(conn)
+        conn = None
+        return [row[0] for row in results]
+    except Exception as e:
+        print(f"Erro ao salvar oportunidades de arbitragem: {e}")
+        if conn:
+            conn.rollback()
+            release_connection(conn)
+        return None
+
+def get_arbitrage_history(limit=10, before=None, user_id=None):
+    """
+    Recupera o histórico de oportunidades de arbitragem, da mais recente para a mais antiga.
+    
+    Usa paginação por chave (keyset): para obter a página seguinte, passar em
+    before o par (date_created, id) da última linha recebida. Cada página custa
+    O(limit) graças ao índice (date_created, id), independentemente do tamanho da tabela.
+    
+    Parâmetros:
+    - limit: Número máximo de linhas
+    - before: Par (date_created, id) a partir do qual continuar (exclusivo)
+    - user_id: Restringir ao histórico de um utilizador
+    """
     conn = get_connection()
     if conn is None:
         return []
     
     try:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        try:
-            # Tentar selecionar todos os campos, incluindo os novos
-            query = """
-                SELECT * FROM arbitrage_opportunities 
-                ORDER BY date_created DESC 
-                LIMIT %s;
-            """
-            cursor.execute(query, (limit,))
-        except Exception as e:
-            print(f"Erro na primeira consulta: {e}")
-            # Fallback para colunas básicas se houver erro
-            query = """
-                SELECT id, odd1, odd2, total_stake, stake1, stake2, profit, profit_percent, date_created 
-                FROM arbitrage_opportunities 
-                ORDER BY date_created DESC 
-                LIMIT %s;
-            """
-            cursor.execute(query, (limit,))
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+        if before is not None:
+            conditions.append("(date_created, id) < (%s, %s)")
+            params.extend(before)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
         
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        query = f"""
+            SELECT * FROM arbitrage_opportunities 
+            {where}
+            ORDER BY date_created DESC, id DESC 
+            LIMIT %s;
+        """
+        cursor.execute(query, params + [limit])
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
+        release_connection(conn)
+        conn = None
         
         # Converter para lista de dicionários
-        history = []
-        for row in results:
-            item = dict(row)
-            # Garantir que os campos novos existam, mesmo que nulos
-            for field in ['event_name', 'bookmaker1', 'bookmaker2']:
-                if field not in item:
-                    item[field] = None
-            history.append(item)
-        
-        return history
+        return [dict(row) for row in results]
     except Exception as e:
         print(f"Erro ao recuperar histórico de arbitragem: {e}")
         if conn:
-            conn.close()
+            release_connection(conn)
         return []
 
+def iter_arbitrage_history(columns, user_id=None, batch_size=2000):
+    """
+    Percorre todo o histórico em lotes, com um cursor do lado do servidor.
+    
+    Apenas um lote de cada vez fica em memória, qualquer que seja o tamanho
+    da tabela. A ligação fica emprestada até o gerador terminar ou ser fechado.
+    
+    Parâmetros:
+    - columns: Colunas a devolver, por esta ordem
+    - user_id: Restringir ao histórico de um utilizador
+    - batch_size: Número de linhas por lote (itersize do cursor)
+    
+    Gera listas de tuplos, do registo mais antigo para o mais recente.
+    Sem ligação disponível levanta psycopg2.OperationalError, para que uma
+    exportação falhe em vez de produzir um ficheiro vazio.
+    """
+    conn = get_connection()
+    if conn is None:
+        raise psycopg2.OperationalError("Sem ligação à base de dados para ler o histórico")
+    
+    try:
+        cursor = conn.cursor(name="arbitrage_history_export")
+        cursor.itersize = batch_size
+        query = psycopg2.sql.SQL("SELECT {} FROM arbitrage_opportunities {} ORDER BY date_created, id;").format(
+            psycopg2.sql.SQL(", ").join(psycopg2.sql.Identifier(column) for column in columns),
+            psycopg2.sql.SQL("WHERE user_id = %s" if user_id is not None else "")
+        )
+        cursor.execute(query, (user_id,) if user_id is not None else None)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+    finally:
+        release_connection(conn)
+
 def delete_arbitrage_opportunity(opportunity_id):
     """Exclui uma oportunidade de arbitragem do banco de dados."""
     conn = get_connection()
@@ -146,10 +355,64 @@ def delete_arbitrage_opportunity(opportunity_id):
         cursor.execute(query, (opportunity_id,))
         conn.commit()
         cursor.close()
-        conn.close()
+        release_connection(conn)
+        conn = None
         return True
     except Exception as e:
         print(f"Erro ao excluir oportunidade de arbitragem: {e}")
         if conn:
-            conn.close()
-        return False
\ No newline at end of file
+            release_connection(conn)
+        return False
+
+def delete_arbitrage_opportunities(ids=None, date_from=None, date_to=None, user_id=None):
+    """
+    Exclui oportunidades de arbitragem numa única instrução e transacção.
+    
+    Os filtros indicados são combinados (AND); é obrigatório indicar pelo menos um.
+    
+    Parâmetros:
+    - ids: Lista de ids a excluir
+    - date_from, date_to: Intervalo de date_created (inclusivo no início, exclusivo no fim)
+    - user_id: Utilizador dono das oportunidades
+    
+    Retorna o número de linhas excluídas, ou None em caso de erro.
+    """
+    conditions = []
+    params = []
+    if ids is not None:
+        if not ids:
+            return 0
+        conditions.append("id = ANY(%s)")
+        params.append(list(ids))
+    if date_from is not None:
+        conditions.append("date_created >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("date_created < %s")
+        params.append(date_to)
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    
+    if not conditions:
+        raise ValueError("Indique ids, um intervalo de datas ou um utilizador")
+    
+    conn = get_connection()
+    if conn is None:
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        query = "DELETE FROM arbitrage_opportunities WHERE " + " AND ".join(conditions) + ";"
+        cursor.execute(query, params)
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        release_connection(conn)
+        conn = None
+        return deleted
+    except Exception as e:
+        print(f"Erro ao excluir oportunidades de arbitragem: {e}")
+        if conn:
+            release_connection(conn)
+        return None
@@ -0,0 +1,263 @@
+"""
+Migrações versionadas do esquema da base de dados
+
+Executar uma vez no arranque (ensure_schema) ou pela linha de comandos:
+
+    python migrations.py
+"""
+import threading
+import database as db
+
+# Chave do advisory lock que impede dois processos de migrarem em simultâneo
+MIGRATION_LOCK_KEY = 724011
+
+# Lista ordenada de migrações: (versão, descrição, SQL)
+MIGRATIONS = [
+    (1, "Tabelas base de oportunidades, utilizadores e transacções", """
+        CREATE TABLE IF NOT EXISTS arbitrage_opportunities (
+            id SERIAL PRIMARY KEY,
+            odd1 DOUBLE PRECISION NOT NULL,
+            odd2 DOUBLE PRECISION NOT NULL,
+            total_stake DOUBLE PRECISION NOT NULL,
+            stake1 DOUBLE PRECISION NOT NULL,
+            stake2 DOUBLE PRECISION NOT NULL,
+            profit DOUBLE PRECISION NOT NULL,
+            profit_percent DOUBLE PRECISION NOT NULL,
+            date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        ALTER TABLE arbitrage_opportunities
+            ADD COLUMN IF NOT EXISTS event_name TEXT,
+            ADD COLUMN IF NOT EXISTS bookmaker1 TEXT,
+            ADD COLUMN IF NOT EXISTS bookmaker2 TEXT;
+        
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash BYTEA NOT NULL,
+            salt BYTEA NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_premium BOOLEAN DEFAULT FALSE,
+            daily_profit_target DECIMAL(10,2) DEFAULT 100.00,
+            total_profit DECIMAL(10,2) DEFAULT 0.00,
+            subscription_expires TIMESTAMP NULL
+        );
+        
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS subscription_plan VARCHAR(50),
+            ADD COLUMN IF NOT EXISTS subscription_activated TIMESTAMP;
+        
+        CREATE TABLE IF NOT EXISTS transactions (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            plan_id VARCHAR(50) NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            currency VARCHAR(3) DEFAULT 'EUR',
+            status VARCHAR(20) DEFAULT 'pending',
+            payment_method VARCHAR(50),
+            transaction_id VARCHAR(200),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (2, "Resultados de mercados com N resultados em JSONB", """
+        ALTER TABLE arbitrage_opportunities
+            ADD COLUMN IF NOT EXISTS outcomes JSONB;
+    """),
+    (3, "Utilizador dono de cada oportunidade", """
+        ALTER TABLE arbitrage_opportunities
+            ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE SET NULL;
+    """),
+    (4, "Índices para histórico por data e por utilizador", """
+        CREATE INDEX IF NOT EXISTS idx_arbitrage_opportunities_date_created
+            ON arbitrage_opportunities (date_created DESC, id DESC);
+        
+        CREATE INDEX IF NOT EXISTS idx_arbitrage_opportunities_user_date
+            ON arbitrage_opportunities (user_id, date_created DESC, id DESC);
+    """),
+    (5, "Agregados diários mantidos por triggers", """
+        CREATE TABLE IF NOT EXISTS arbitrage_daily_stats (
+            day DATE NOT NULL,
+            user_id INTEGER NOT NULL DEFAULT 0,
+            opportunities INTEGER NOT NULL,
+            total_profit DOUBLE PRECISION NOT NULL,
+            sum_profit_percent DOUBLE PRECISION NOT NULL,
+            max_profit DOUBLE PRECISION,
+            min_profit DOUBLE PRECISION,
+            total_wagered DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (day, user_id)
+        );
+        
+        -- Recalcula um dia de um utilizador (0 = anónimo) a partir das linhas originais
+        CREATE OR REPLACE FUNCTION refresh_arbitrage_daily_stats(p_day DATE, p_user INTEGER)
+        RETURNS VOID AS $$
+        BEGIN
+            DELETE FROM arbitrage_daily_stats WHERE day = p_day AND user_id = p_user;
+            INSERT INTO arbitrage_daily_stats
+                (day, user_id, opportunities, total_profit, sum_profit_percent,
+                 max_profit, min_profit, total_wagered)
+            SELECT p_day, p_user, COUNT(*), SUM(profit), SUM(profit_percent),
+                   MAX(profit), MIN(profit), SUM(total_stake)
+            FROM arbitrage_opportunities
+            WHERE date_created >= p_day AND date_created < p_day + 1
+              AND COALESCE(user_id, 0) = p_user
+            HAVING COUNT(*) > 0;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        -- Inserções somam-se aos agregados; exclusões e alterações recalculam os dias afetados
+        CREATE OR REPLACE FUNCTION maintain_arbitrage_daily_stats()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            bucket RECORD;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO arbitrage_daily_stats AS s
+                    (day, user_id, opportunities, total_profit, sum_profit_percent,
+                     max_profit, min_profit, total_wagered)
+                SELECT date_created::date, COALESCE(user_id, 0), COUNT(*), SUM(profit),
+                       SUM(profit_percent), MAX(profit), MIN(profit), SUM(total_stake)
+                FROM new_rows
+                GROUP BY 1, 2
+                ON CONFLICT (day, user_id) DO UPDATE SET
+                    opportunities = s.opportunities + EXCLUDED.opportunities,
+                    total_profit = s.total_profit + EXCLUDED.total_profit,
+                    sum_profit_percent = s.sum_profit_percent + EXCLUDED.sum_profit_percent,
+                    max_profit = GREATEST(s.max_profit, EXCLUDED.max_profit),
+                    min_profit = LEAST(s.min_profit, EXCLUDED.min_profit),
+                    total_wagered = s.total_wagered + EXCLUDED.total_wagered;
+            ELSIF TG_OP = 'DELETE' THEN
+                FOR bucket IN
+                    SELECT DISTINCT date_created::date AS day, COALESCE(user_id, 0) AS user_id FROM old_rows
+                LOOP
+                    PERFORM refresh_arbitrage_daily_stats(bucket.day, bucket.user_id);
+                END LOOP;
+            ELSE
+                FOR bucket IN
+                    SELECT date_created::date AS day, COALESCE(user_id, 0) AS user_id FROM old_rows
+                    UNION
+                    SELECT date_created::date, COALESCE(user_id, 0) FROM new_rows
+                LOOP
+                    PERFORM refresh_arbitrage_daily_stats(bucket.day, bucket.user_id);
+                END LOOP;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        DROP TRIGGER IF EXISTS arbitrage_daily_stats_insert ON arbitrage_opportunities;
+        CREATE TRIGGER arbitrage_daily_stats_insert
+            AFTER INSERT ON arbitrage_opportunities
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION maintain_arbitrage_daily_stats();
+        
+        DROP TRIGGER IF EXISTS arbitrage_daily_stats_delete ON arbitrage_opportunities;
+        CREATE TRIGGER arbitrage_daily_stats_delete
+            AFTER DELETE ON arbitrage_opportunities
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION maintain_arbitrage_daily_stats();
+        
+        DROP TRIGGER IF EXISTS arbitrage_daily_stats_update ON arbitrage_opportunities;
+        CREATE TRIGGER arbitrage_daily_stats_update
+            AFTER UPDATE ON arbitrage_opportunities
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION maintain_arbitrage_daily_stats();
+        
+        -- Preencher com o histórico já existente
+        DELETE FROM arbitrage_daily_stats;
+        INSERT INTO arbitrage_daily_stats
+            (day, user_id, opportunities, total_profit, sum_profit_percent,
+             max_profit, min_profit, total_wagered)
+        SELECT date_created::date, COALESCE(user_id, 0), COUNT(*), SUM(profit),
+               SUM(profit_percent), MAX(profit), MIN(profit), SUM(total_stake)
+        FROM arbitrage_opportunities
+        GROUP BY 1, 2;
+    """),
+]
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def run_migrations(verbose=False):
+    """
+    Aplica as migrações pendentes, cada uma na sua própria transacção.
+    
+    Args:
+        verbose: Mostrar cada migração aplicada
+    
+    Returns:
+        Lista de versões aplicadas, ou None se não houver ligação à base de dados
+    """
+    conn = db.get_connection()
+    if conn is None:
+        return None
+    
+    applied = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            conn.commit()
+            
+            cursor.execute("SELECT version FROM schema_migrations;")
+            done = {row[0] for row in cursor.fetchall()}
+            
+            for version, description, sql in MIGRATIONS:
+                if version in done:
+                    continue
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+                if verbose:
+                    print(f"Migração {version} aplicada: {description}")
+        finally:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+            cursor.close()
+        
+        db.release_connection(conn)
+        conn = None
+        return applied
+    except Exception as e:
+        print(f"Erro ao aplicar migrações: {e}")
+        db.release_connection(conn, discard=True)
+        raise
+
+
+def ensure_schema():
+    """
+    Garante que o esquema está atualizado, executando as migrações uma vez por processo.
+    
+    Returns:
+        True se o esquema estiver pronto
+    """
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            try:
+                _schema_ready = run_migrations() is not None
+            except Exception:
+                _schema_ready = False
+        return _schema_ready
+
+
+if __name__ == "__main__":
+    applied = run_migrations(verbose=True)
+    if applied is None:
+        print("Sem ligação à base de dados")
+    elif not applied:
+        print("Esquema já está atualizado")
@@ -1,15 +1,503 @@
 import os
+import json
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
+import heapq
+import random
+import threading
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple, Callable
+from arbitrage_engine import IncrementalArbitrageEngine
+from odds_quota import QuotaScheduler
+from security_utils import RateLimiter
+
+
+class SportCatalogue:
+    """
+    Cache do catálogo de esportes partilhado por todo o processo.
+    
+    A lista de esportes quase não muda durante o dia, por isso é guardada em
+    memória com TTL e, opcionalmente, num snapshot em disco que sobrevive a
+    reinícios do processo.
+    """
+    
+    def __init__(self, ttl: float = 6 * 3600, snapshot_path: Optional[str] = None):
+        """
+        Inicializa o catálogo.
+        
+        Args:
+            ttl: Tempo de vida do catálogo em segundos
+            snapshot_path: Caminho opcional do snapshot JSON em disco
+        """
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._sports: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = 0.0
+    
+    def get(self, fetch: Callable[[], List[Dict[str, Any]]], force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Devolve o catálogo, buscando-o com fetch apenas se estiver expirado.
+        
+        Args:
+            fetch: Função que busca a lista de esportes na API
+            force_refresh: Ignorar a cache e buscar novamente
+            
+        Returns:
+            Lista de esportes
+        """
+        with self._lock:
+            if not force_refresh:
+                if self._sports is not None and self._is_fresh(self._fetched_at):
+                    return self._sports
+                if self._load_snapshot():
+                    return self._sports
+            
+            sports = fetch()
+            self._sports = sports
+            self._fetched_at = time.time()
+            self._save_snapshot()
+            return sports
+    
+    def peek(self) -> List[Dict[str, Any]]:
+        """Devolve o catálogo já carregado sem chamar a API (lista vazia se ainda não houver)."""
+        return self._sports or []
+    
+    def invalidate(self) -> None:
+        """Descarta o catálogo em memória (o snapshot em disco é mantido)."""
+        with self._lock:
+            self._sports = None
+            self._fetched_at = 0.0
+    
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl
+    
+    def _load_snapshot(self) -> bool:
+        """Carrega o snapshot em disco se existir e ainda estiver dentro do TTL."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            fetched_at = float(snapshot["fetched_at"])
+            if not self._is_fresh(fetched_at):
+                return False
+            self._sports = snapshot["sports"]
+            self._fetched_at = fetched_at
+            return True
+        except Exception as e:
+            print(f"Erro ao ler snapshot do catálogo de esportes: {e}")
+            return False
+    
+    def _save_snapshot(self) -> None:
+        """Escreve o snapshot em disco de forma atómica."""
+        if not self.snapshot_path:
+            return
+        
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"fetched_at": self._fetched_at, "sports": self._sports}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Erro ao guardar snapshot do catálogo de esportes: {e}")
+
+
+class OddsAPIError(Exception):
+    """Erro de uma chamada à The Odds API."""
+    
+    # Indica se vale a pena repetir o pedido mais tarde
+    retryable = False
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, endpoint: Optional[str] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class OddsAPIAuthError(OddsAPIError):
+    """Chave inválida ou quota esgotada (401/403)."""
+
+
+class OddsAPIClientError(OddsAPIError):
+    """Pedido rejeitado pela API (restantes 4xx)."""
+
+
+class OddsAPIRateLimitError(OddsAPIError):
+    """Demasiados pedidos (429)."""
+    retryable = True
+
+
+class OddsAPIServerError(OddsAPIError):
+    """Falha do lado da API (5xx) ou da rede."""
+    retryable = True
+
+
+class OddsAPIUnavailableError(OddsAPIError):
+    """Circuit breaker do endpoint aberto: o pedido nem chegou a ser feito."""
+
+
+def classify_error(status_code: int, text: str, endpoint: str,
+                   headers: Optional[Dict[str, Any]] = None) -> OddsAPIError:
+    """
+    Converte uma resposta de erro na exceção correspondente.
+    
+    Args:
+        status_code: Código HTTP da resposta
+        text: Corpo da resposta
+        endpoint: Endpoint chamado
+        headers: Cabeçalhos da resposta (para Retry-After)
+    
+    Returns:
+        Exceção OddsAPIError da classe adequada
+    """
+    message = f"Erro na API (status {status_code}): {text}"
+    if status_code == 429:
+        retry_after = None
+        try:
+            retry_after = float((headers or {}).get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+        return OddsAPIRateLimitError(message, status_code, endpoint, retry_after)
+    if status_code >= 500:
+        return OddsAPIServerError(message, status_code, endpoint)
+    if status_code in (401, 403):
+        return OddsAPIAuthError(message, status_code, endpoint)
+    return OddsAPIClientError(message, status_code, endpoint)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um endpoint.
+    
+    Após failure_threshold falhas seguidas o circuito abre e os pedidos são recusados
+    sem chegar à API. Passado reset_timeout é deixado passar um único pedido de teste
+    (meio-aberto): se correr bem o circuito fecha, caso contrário volta a abrir.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Inicializa o circuit breaker.
+        
+        Args:
+            failure_threshold: Falhas seguidas que abrem o circuito
+            reset_timeout: Segundos até deixar passar um pedido de teste
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+    
+    @property
+    def state(self) -> str:
+        """Estado atual: 'closed', 'open' ou 'half_open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+    
+    def allow(self) -> bool:
+        """Indica se um pedido pode avançar (reservando o pedido de teste quando meio-aberto)."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+    
+    def record_success(self) -> None:
+        """Regista um pedido bem sucedido e fecha o circuito."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+    
+    def record_failure(self) -> None:
+        """Regista uma falha; abre o circuito ao atingir o limite ou se o teste falhar."""
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class CachedResponse(NamedTuple):
+    """Corpo de uma resposta da API guardado na ResponseCache."""
+    body: bytes
+    data: Any
+    digest: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class ResponseCache:
+    """
+    Cache LRU dos corpos de resposta da API por URL e parâmetros.
+    
+    Dentro do TTL a resposta é servida sem chamar a API. Depois disso o pedido é
+    condicional (If-None-Match / If-Modified-Since) quando a API devolveu ETag ou
+    Last-Modified; uma resposta 304, ou um corpo com o mesmo hash, reaproveita os
+    dados já interpretados em vez de voltar a ler o JSON.
+    """
+    
+    def __init__(self, ttl: float = 10.0, max_entries: int = 128):
+        """
+        Inicializa a cache.
+        
+        Args:
+            ttl: Segundos durante os quais uma resposta é servida sem nova chamada
+            max_entries: Número máximo de respostas guardadas
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+    
+    @staticmethod
+    def key(url: str, params: Dict[str, Any]) -> Tuple:
+        """Chave de cache de um pedido (a chave da API não faz parte da chave)."""
+        return url, tuple(sorted((name, str(value)) for name, value in params.items() if name != "apiKey"))
+    
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        """Devolve a resposta guardada, independentemente da idade."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def get_fresh(self, key: Tuple) -> Optional[CachedResponse]:
+        """Devolve a resposta guardada apenas se ainda estiver dentro do TTL."""
+        entry = self.get(key)
+        if entry is not None and time.time() - entry.fetched_at < self.ttl:
+            return entry
+        return None
+    
+    def conditional_headers(self, key: Tuple) -> Dict[str, str]:
+        """Cabeçalhos de pedido condicional para a resposta guardada (vazio se não houver)."""
+        entry = self.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+    
+    def store(self, key: Tuple, body: bytes, parse: Callable[[], Any], etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> CachedResponse:
+        """
+        Guarda um corpo de resposta, interpretando-o apenas se for diferente do anterior.
+        
+        Args:
+            key: Chave do pedido
+            body: Corpo bruto da resposta
+            parse: Função que interpreta o corpo (chamada só se o hash mudou)
+            etag: Cabeçalho ETag da resposta
+            last_modified: Cabeçalho Last-Modified da resposta
+        
+        Returns:
+            Entrada guardada
+        """
+        digest = hashlib.sha1(body).hexdigest()
+        previous = self.get(key)
+        data = previous.data if previous is not None and previous.digest == digest else parse()
+        entry = CachedResponse(body, data, digest, etag, last_modified, time.time())
+        self._put(key, entry)
+        return entry
+    
+    def revalidate(self, key: Tuple) -> Optional[CachedResponse]:
+        """Marca a resposta guardada como confirmada agora (resposta 304)."""
+        entry = self.get(key)
+        if entry is not None:
+            entry = entry._replace(fetched_at=time.time())
+            self._put(key, entry)
+        return entry
+    
+    def clear(self) -> None:
+        """Remove todas as respostas guardadas."""
+        with self._lock:
+            self._entries.clear()
+    
+    def _put(self, key: Tuple, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RequestScheduler:
+    """
+    Fila de pedidos com hora marcada que devolve futures em vez de bloquear.
+    
+    Cada pedido entra num heap ordenado pela hora da sua vaga de rate limit. Uma
+    única thread despachante acorda quando a vaga mais próxima chega e entrega o
+    pedido a uma thread pool; ninguém dorme à espera da vaga, e quem pediu só
+    espera (future.result()) se e quando precisar do resultado.
+    """
+    
+    def __init__(self, max_workers: int = 4):
+        """
+        Inicializa o scheduler.
+        
+        Args:
+            max_workers: Número máximo de pedidos HTTP executados em simultâneo
+        """
+        self.max_workers = max(1, max_workers)
+        self._condition = threading.Condition()
+        self._queue: List[Tuple[float, int, Callable[[], Any], Future]] = []
+        self._sequence = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def schedule(self, delay: float, fn: Callable[[], Any]) -> Future:
+        """
+        Agenda fn para daqui a delay segundos.
+        
+        Args:
+            delay: Espera em segundos até à vaga do pedido
+            fn: Função que executa o pedido
+        
+        Returns:
+            Future com o resultado (ou a exceção) de fn
+        """
+        future = Future()
+        with self._condition:
+            self._start()
+            heapq.heappush(self._queue, (time.monotonic() + max(delay, 0.0), self._sequence, fn, future))
+            self._sequence += 1
+            self._condition.notify()
+        return future
+    
+    @property
+    def pending(self) -> int:
+        """Número de pedidos à espera da sua vaga."""
+        with self._condition:
+            return len(self._queue)
+    
+    def _start(self) -> None:
+        """Arranca a thread despachante e a pool na primeira utilização (com o lock adquirido)."""
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="odds-request")
+            self._thread = threading.Thread(target=self._dispatch, name="odds-scheduler", daemon=True)
+            self._thread.start()
+    
+    def _dispatch(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout)
+                _, _, fn, future = heapq.heappop(self._queue)
+            
+            # Pedidos cancelados enquanto esperavam já não gastam chamada à API
+            if future.set_running_or_notify_cancel():
+                self._executor.submit(self._run, fn, future)
+    
+    @staticmethod
+    def _run(fn: Callable[[], Any], future: Future) -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+
+# Sessão HTTP partilhada pelo processo (keep-alive e pool de ligações)
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """
+    Cria uma sessão HTTP com pool de ligações, keep-alive e compressão gzip.
+    
+    Args:
+        pool_size: Número máximo de ligações mantidas abertas por host
+        
+    Returns:
+        Sessão requests configurada
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive"
+    })
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """
+    Devolve a sessão HTTP partilhada, criando-a na primeira utilização.
+    
+    O tamanho do pool pode ser ajustado com ODDS_HTTP_POOL_SIZE.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            pool_size = int(os.environ.get("ODDS_HTTP_POOL_SIZE", 10))
+            _http_session = create_http_session(pool_size)
+        return _http_session
+
+
+# Catálogo partilhado por todas as instâncias de OddsAPI no processo
+sport_catalogue = SportCatalogue(
+    ttl=float(os.environ.get("ODDS_SPORTS_CACHE_TTL", 6 * 3600)),
+    snapshot_path=os.environ.get("ODDS_SPORTS_CACHE_FILE")
+)
+
 
 class OddsAPI:
     """Classe para interagir com a The Odds API para buscar odds."""
     
     BASE_URL = "https://api.the-odds-api.com/v4/sports"
     
-    def __init__(self):
-        """Inicializa a API com a chave da API de ambiente."""
+    # Esportes verificados por omissão em find_arbitrage_opportunities
+    DEFAULT_SPORTS = ["soccer", "tennis", "basketball", "baseball"]
+    
+    # Mercados dos jogos analisados por omissão (pedidos numa só chamada por esporte)
+    DEFAULT_MARKETS = ("h2h", "totals", "spreads")
+    
+    # Mercado dos códigos de esporte com outrights (ex: vencedor da competição)
+    OUTRIGHTS_MARKET = "outrights"
+    
+    def __init__(self, max_workers: int = 4, min_interval: float = 1.0,
+                 session: Optional[requests.Session] = None, timeout: float = 10.0,
+                 snapshot_store: Optional[Any] = None, rate_limiter: Optional[RateLimiter] = None,
+                 quota: Optional[QuotaScheduler] = None, max_retries: int = 3,
+                 response_cache: Optional[ResponseCache] = None, markets: Optional[List[str]] = None,
+                 scan_outrights: Optional[bool] = None):
+        """
+        Inicializa a API com a chave da API de ambiente.
+        
+        Args:
+            max_workers: Número máximo de esportes buscados em paralelo
+            min_interval: Intervalo mínimo (segundos) entre o início de duas chamadas à API
+            session: Sessão HTTP a usar (por omissão a sessão partilhada do processo)
+            timeout: Timeout de cada requisição em segundos
+            snapshot_store: OddsSnapshotStore partilhada (opcional) para deduplicar buscas
+            rate_limiter: RateLimiter partilhado (por omissão um por cliente com 1 chamada por min_interval)
+            quota: Planeador da quota mensal (por omissão um por cliente, reinício em ODDS_QUOTA_RESET_DAY)
+            max_retries: Repetições de um pedido após 429, 5xx ou falha de rede
+            response_cache: Cache de respostas (por omissão uma por cliente, TTL em ODDS_RESPONSE_CACHE_TTL)
+            markets: Mercados dos jogos analisados (por omissão ODDS_MARKETS ou DEFAULT_MARKETS)
+            scan_outrights: Analisar também os códigos de outrights dos esportes (por omissão ODDS_SCAN_OUTRIGHTS)
+        """
         self.api_key = os.environ.get("ODDS_API_KEY")
         if not self.api_key:
             print("ODDS_API_KEY não encontrada nas variáveis de ambiente")
@@ -31,9 +519,70 @@ class OddsAPI:
         self.api_calls = 0
         # Timestamp da última chamada à API
         self.last_call = 0
+        
+        # Orçamento de rate limit partilhado entre todas as threads deste cliente
+        self.max_workers = max(1, max_workers)
+        self.min_interval = min_interval
+        self.rate_limiter = rate_limiter or RateLimiter(max_calls=1, time_window=min_interval)
+        self._rate_lock = threading.Lock()
+        
+        # Pedidos esperam a sua vaga numa fila com futures, sem threads a dormir
+        self.scheduler = RequestScheduler(max_workers=self.max_workers)
+        
+        # Repetição com backoff exponencial (com jitter) e um circuit breaker por endpoint de cada esporte
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = 0.5
+        self.backoff_cap = 30.0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        
+        # Corpos de resposta por URL/parâmetros e hash do último payload aplicado aos motores
+        self.response_cache = response_cache or ResponseCache(ttl=float(os.environ.get("ODDS_RESPONSE_CACHE_TTL", 10)))
+        self._applied_digests: Dict[Tuple[str, str, str], Tuple[Optional[str], ...]] = {}
+        
+        # Último erro e última busca bem sucedida por (esporte, região, mercado)
+        self.fetch_errors: Dict[Tuple[str, str, str], str] = {}
+        self._fetched_at: Dict[Tuple[str, str, str], float] = {}
+        
+        # Quota do período de faturação, atualizada pelos cabeçalhos de cada resposta
+        self.quota = quota or QuotaScheduler(reset_day=int(os.environ.get("ODDS_QUOTA_RESET_DAY", 1)))
+        
+        # Reutilizar ligações TCP/TLS entre chamadas
+        self.session = session or get_http_session()
+        self.timeout = timeout
+        
+        # Snapshots partilhados entre sessões (None = buscar sempre na API)
+        self.snapshot_store = snapshot_store
+        
+        # Mercados analisados quando find_arbitrage_opportunities não recebe um mercado
+        if markets is None:
+            markets = os.environ.get("ODDS_MARKETS", ",".join(self.DEFAULT_MARKETS)).split(",")
+        self.markets = [market.strip() for market in markets if market.strip()]
+        if scan_outrights is None:
+            scan_outrights = os.environ.get("ODDS_SCAN_OUTRIGHTS", "1").lower() not in ("0", "false", "no")
+        self.scan_outrights = scan_outrights
+        
+        # Motores incrementais de arbitragem por (esporte, região, mercado)
+        self._engines: Dict[Tuple[str, str, str], IncrementalArbitrageEngine] = {}
+        self._engines_lock = threading.Lock()
     
-    def get_sports(self) -> List[Dict[str, Any]]:
-        """Busca a lista de esportes disponíveis."""
+    def get_sports(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Busca a lista de esportes disponíveis.
+        
+        O resultado vem do catálogo partilhado do processo; a API só é chamada
+        quando o catálogo expira ou com force_refresh=True.
+        
+        Args:
+            force_refresh: Ignorar a cache e buscar novamente na API
+            
+        Returns:
+            Lista de esportes
+        """
+        return sport_catalogue.get(self._fetch_sports, force_refresh=force_refresh)
+    
+    def _fetch_sports(self) -> List[Dict[str, Any]]:
+        """Busca a lista de esportes diretamente na API."""
         url = f"{self.BASE_URL}"
         params = {
             "apiKey": self.api_key
@@ -41,7 +590,84 @@ class OddsAPI:
         
         return self._make_request(url, params)
     
-    def get_odds(self, sport: str, region: str = "eu", market: str = "h2h") -> List[Dict[str, Any]]:
+    def resolve_sport_keys(self, sport: str) -> List[str]:
+        """
+        Resolve um nome genérico de esporte para os códigos específicos da API.
+        
+        Aceita tanto os nomes mapeados ('futebol') como os grupos da API ('soccer').
+        Códigos específicos ('soccer_epl') são devolvidos sem alteração.
+        
+        Args:
+            sport: Nome ou código do esporte
+            
+        Returns:
+            Lista de códigos de esporte correspondentes
+        """
+        if sport in self.sport_map:
+            sport_code = self.sport_map[sport]
+        elif sport in self.sport_map.values():
+            sport_code = sport
+        else:
+            return [sport]
+        
+        # Filtrar para encontrar códigos que contenham o esporte genérico; os códigos de
+        # outrights não têm jogos e são analisados à parte (ver outright_sport_keys)
+        all_sports = self.get_sports()
+        sport_codes = [s["key"] for s in all_sports if sport_code in s["key"] and not s.get("has_outrights")]
+        return sport_codes or [sport]
+    
+    def outright_sport_keys(self, sports: Optional[List[str]] = None, fetch: bool = True) -> List[str]:
+        """
+        Devolve os códigos de esporte ativos com outrights dos esportes indicados.
+        
+        Args:
+            sports: Esportes (nomes mapeados, grupos ou códigos; por omissão DEFAULT_SPORTS)
+            fetch: Se False, usa apenas o catálogo já carregado, sem chamar a API
+            
+        Returns:
+            Lista de códigos com has_outrights
+        """
+        groups = [self.sport_map.get(sport, sport) for sport in (sports or self.DEFAULT_SPORTS)]
+        try:
+            catalogue = self.get_sports() if fetch else sport_catalogue.peek()
+        except Exception as e:
+            print(f"Erro ao obter os esportes com outrights: {e}")
+            return []
+        
+        return [
+            s["key"] for s in catalogue
+            if s.get("has_outrights") and s.get("active", True)
+            and any(s["key"] == group or s["key"].startswith(f"{group}_") for group in groups)
+        ]
+    
+    def scan_targets(self, sports: Optional[List[str]] = None, market: Optional[str] = None,
+                     fetch: bool = True) -> List[Tuple[str, str]]:
+        """
+        Lista os pares (esporte, mercado) a analisar.
+        
+        Com um mercado explícito todos os esportes usam esse mercado. Sem mercado,
+        os esportes pedem os mercados configurados numa só chamada e, se
+        scan_outrights, juntam-se os seus códigos de outrights com OUTRIGHTS_MARKET.
+        
+        Args:
+            sports: Esportes a analisar (por omissão DEFAULT_SPORTS)
+            market: Mercado (ou mercados separados por vírgula) a usar em todos os esportes
+            fetch: Se False, os códigos de outrights vêm apenas do catálogo já carregado
+            
+        Returns:
+            Lista de (código ou nome do esporte, mercados)
+        """
+        sports = list(sports) if sports else list(self.DEFAULT_SPORTS)
+        if market is not None:
+            return [(sport, market) for sport in sports]
+        
+        targets = [(sport, ",".join(self.markets)) for sport in sports] if self.markets else []
+        if self.scan_outrights:
+            targets.extend((key, self.OUTRIGHTS_MARKET) for key in self.outright_sport_keys(sports, fetch=fetch))
+        return targets
+    
+    def get_odds(self, sport: str, region: str = "eu", market: str = "h2h",
+                 all_keys: bool = False) -> List[Dict[str, Any]]:
         """
         Busca odds para um determinado esporte.
         
@@ -49,146 +675,302 @@ class OddsAPI:
             sport: Código do esporte (ex: 'soccer_brazil_campeonato' ou nome mapeado 'futebol')
             region: Região para as odds (ex: 'eu', 'us', 'uk')
             market: Tipo de mercado (ex: 'h2h' para moneyline, 'spreads', 'totals')
+            all_keys: Se True, um nome genérico expande para todos os códigos
+                correspondentes em vez de apenas o primeiro
             
         Returns:
             Lista de jogos com suas odds
         """
+        return self._get_odds(sport, region, market, all_keys)[0]
+    
+    def _get_odds(self, sport: str, region: str, market: str,
+                  all_keys: bool = False) -> Tuple[List[Dict[str, Any]], Tuple[Optional[str], ...]]:
+        """Busca as odds e devolve também o hash do corpo de cada resposta usada."""
         # Mapear nome do esporte se for um nome genérico
-        if sport in self.sport_map:
-            sport_code = self.sport_map[sport]
-            # Buscar todos os esportes para encontrar o código específico
-            all_sports = self.get_sports()
-            # Filtrar para encontrar códigos que contenham o esporte genérico
-            sport_codes = [s["key"] for s in all_sports if sport_code in s["key"]]
-            if sport_codes:
-                sport = sport_codes[0]  # Usar o primeiro código encontrado
-        
-        url = f"{self.BASE_URL}/{sport}/odds"
-        params = {
-            "apiKey": self.api_key,
-            "regions": region,
-            "markets": market,
-            "oddsFormat": "decimal"
-        }
+        sport_codes = self.resolve_sport_keys(sport)
+        if not all_keys:
+            sport_codes = sport_codes[:1]  # Usar o primeiro código encontrado
         
-        return self._make_request(url, params)
+        # Agendar todos os códigos de uma vez e só depois esperar pelos resultados
+        requests_made = []
+        for sport_code in sport_codes:
+            url = f"{self.BASE_URL}/{sport_code}/odds"
+            params = {
+                "apiKey": self.api_key,
+                "regions": region,
+                "markets": market,
+                "oddsFormat": "decimal"
+            }
+            requests_made.append((ResponseCache.key(url, params), self.request_async(url, params)))
+        
+        games = []
+        digests = []
+        for cache_key, future in requests_made:
+            games.extend(future.result())
+            entry = self.response_cache.get(cache_key)
+            digests.append(entry.digest if entry is not None else None)
+        return games, tuple(digests)
     
-    def get_best_odds(self, sport: str) -> List[Dict[str, Any]]:
+    def get_best_odds(self, sport: str, region: str = "eu", market: str = "h2h") -> List[Dict[str, Any]]:
         """
         Busca os jogos e encontra as melhores odds para cada resultado.
         
         Args:
             sport: Código do esporte
+            region: Região para as odds
+            market: Tipo de mercado; aceita vários separados por vírgula
+                (ex: 'h2h,totals,spreads' ou 'outrights')
             
         Returns:
             Lista de jogos com odds otimizadas para arbitragem
         """
-        games = self.get_odds(sport)
+        games, digests = self._get_odds(sport, region, market)
+        
+        # Corpo igual ao último aplicado: os motores já têm este estado, não há nada a recalcular
+        key = (sport, region, market)
+        unchanged = None not in digests and self._applied_digests.get(key) == digests
+        
+        # Estado incremental por (esporte, região, mercado): só os eventos alterados são recalculados
         arb_opportunities = []
+        for market_key in market.split(","):
+            engine = self._get_engine(sport, region, market_key.strip())
+            if not unchanged:
+                engine.apply(games)
+            arb_opportunities.extend(engine.opportunities())
+        self._applied_digests[key] = digests
         
-        for game in games:
-            if "bookmakers" not in game or not game["bookmakers"]:
-                continue
-            
-            home_team = game["home_team"]
-            away_team = game["away_team"]
-            
-            # Encontrar as melhores odds para cada resultado
-            best_home_odd = 0
-            best_away_odd = 0
-            best_draw_odd = 0
-            
-            # Bookmakers que ofereceram as melhores odds
-            best_home_bookie = ""
-            best_away_bookie = ""
-            best_draw_bookie = ""
+        if "," in market:
+            arb_opportunities.sort(key=lambda x: x["profit_percent"], reverse=True)
+        return arb_opportunities
+    
+    def get_top_combinations(self, event_id: str, market: str = "h2h", k: int = 5,
+                             min_profit: float = 0.0, line: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Devolve as k combinações de bookmakers mais lucrativas de um evento já carregado.
+        
+        Permite contornar o limite de aposta da casa com a melhor odd usando a
+        combinação seguinte. Não faz chamadas à API: usa os preços guardados nos motores.
+        
+        Args:
+            event_id: ID do evento
+            market: Mercado da oportunidade
+            k: Número máximo de combinações
+            min_profit: Lucro mínimo (%) de uma combinação
+            line: Linha da oportunidade em mercados com linha (totals, spreads)
             
-            for bookmaker in game["bookmakers"]:
-                bookie_name = bookmaker["title"]
-                
-                for market in bookmaker["markets"]:
-                    if market["key"] != "h2h":
-                        continue
-                    
-                    for outcome in market["outcomes"]:
-                        price = outcome["price"]
-                        name = outcome["name"]
-                        
-                        if name == home_team and price > best_home_odd:
-                            best_home_odd = price
-                            best_home_bookie = bookie_name
-                        elif name == away_team and price > best_away_odd:
-                            best_away_odd = price
-                            best_away_bookie = bookie_name
-                        elif name == "Draw" and price > best_draw_odd:
-                            best_draw_odd = price
-                            best_draw_bookie = bookie_name
+        Returns:
+            Lista de combinações da mais lucrativa para a menos
+        """
+        with self._engines_lock:
+            engines = [engine for (_, _, market_key), engine in self._engines.items() if market_key == market]
+        
+        for engine in engines:
+            combinations = engine.top_combinations(event_id, k=k, min_profit=min_profit, line=line)
+            if combinations:
+                return combinations
+        return []
+    
+    def next_event_start(self, sport: str, region: str = "eu", market: str = "h2h") -> Optional[float]:
+        """
+        Devolve o início do evento mais cedo já carregado para um esporte.
+        
+        Args:
+            sport: Código do esporte
+            region: Região para as odds
+            market: Tipo de mercado
+        
+        Returns:
+            Timestamp do evento mais cedo (no passado se houver jogos a decorrer), ou None
+        """
+        with self._engines_lock:
+            engines = [self._engines.get((sport, region, market_key.strip())) for market_key in market.split(",")]
+        
+        starts = [engine.next_commence_time() for engine in engines if engine is not None]
+        starts = [start for start in starts if start]
+        if not starts:
+            return None
+        try:
+            return datetime.fromisoformat(min(starts).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    
+    def _get_engine(self, sport: str, region: str, market_key: str) -> IncrementalArbitrageEngine:
+        """Devolve (criando se necessário) o motor incremental de um esporte/região/mercado."""
+        key = (sport, region, market_key)
+        with self._engines_lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = self._engines[key] = IncrementalArbitrageEngine(market_key)
+            return engine
+    
+    def get_sport_opportunities(self, sport: str, region: str = "eu", market: str = "h2h",
+                                force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Devolve as oportunidades de um esporte, passando pela snapshot store se configurada.
+        
+        Se a API falhar (ou a quota estiver esgotada) e já houver dados deste esporte,
+        devolve a última versão válida com o marcador de desatualização (ver last_good_opportunities).
+        
+        Args:
+            sport: Código do esporte
+            region: Região para as odds
+            market: Tipo de mercado
+            force_refresh: Pedir dados novos mesmo que o snapshot ainda seja válido
             
-            # Calcular se há oportunidade de arbitragem
-            has_draw = best_draw_odd > 0
+        Returns:
+            Lista de jogos com odds otimizadas para arbitragem
+        """
+        key = (sport, region, market)
+        try:
+            if self.quota.exhausted:
+                raise OddsAPIAuthError("Quota da API esgotada até ao próximo período")
             
-            if has_draw:
-                # Jogo com possibilidade de empate (futebol, etc)
-                inv_sum = (1 / best_home_odd) + (1 / best_away_odd) + (1 / best_draw_odd)
-                outcomes = [
-                    {"name": home_team, "odd": best_home_odd, "bookmaker": best_home_bookie},
-                    {"name": away_team, "odd": best_away_odd, "bookmaker": best_away_bookie},
-                    {"name": "Empate", "odd": best_draw_odd, "bookmaker": best_draw_bookie}
-                ]
+            if self.snapshot_store is None:
+                opportunities = self.get_best_odds(sport, region=region, market=market)
             else:
-                # Jogo sem empate (basquete, tenis, etc)
-                inv_sum = (1 / best_home_odd) + (1 / best_away_odd)
-                outcomes = [
-                    {"name": home_team, "odd": best_home_odd, "bookmaker": best_home_bookie},
-                    {"name": away_team, "odd": best_away_odd, "bookmaker": best_away_bookie}
-                ]
-            
-            # Se a soma das probabilidades for menor que 1, há oportunidade de arbitragem
-            arb_opportunity = inv_sum < 1
-            
-            arb_opportunities.append({
-                "id": game["id"],
-                "sport": game["sport_key"],
-                "commence_time": game["commence_time"],
-                "home_team": home_team,
-                "away_team": away_team,
-                "has_draw": has_draw,
-                "outcomes": outcomes,
-                "implied_prob_sum": inv_sum,
-                "is_arbitrage": arb_opportunity,
-                "profit_percent": ((1 / inv_sum) - 1) * 100 if arb_opportunity else 0
-            })
+                snapshot = self.snapshot_store.get_or_fetch(
+                    key,
+                    lambda: self.get_best_odds(sport, region=region, market=market),
+                    force_refresh=force_refresh
+                )
+                opportunities = list(snapshot.opportunities)
+        except OddsAPIError as e:
+            self.fetch_errors[key] = str(e)
+            stale = self.last_good_opportunities(sport, region=region, market=market)
+            if stale is None:
+                raise
+            return stale
         
-        # Ordenar por maior lucro potencial
-        arb_opportunities.sort(key=lambda x: x["profit_percent"], reverse=True)
-        return arb_opportunities
+        self.fetch_errors.pop(key, None)
+        self._fetched_at[key] = time.time()
+        return opportunities
+    
+    def last_good_opportunities(self, sport: str, region: str = "eu",
+                                market: str = "h2h") -> Optional[List[Dict[str, Any]]]:
+        """
+        Devolve as últimas oportunidades válidas de um esporte, marcadas como desatualizadas.
+        
+        Cada oportunidade é uma cópia com stale=True e fetched_at (timestamp dos dados).
+        Vêm do último snapshot publicado ou, sem snapshot store, do estado dos motores.
+        
+        Args:
+            sport: Código do esporte
+            region: Região para as odds
+            market: Tipo de mercado
+        
+        Returns:
+            Lista de oportunidades, ou None se ainda não houver dados deste esporte
+        """
+        key = (sport, region, market)
+        if self.snapshot_store is not None:
+            snapshot = self.snapshot_store.get(key)
+            if snapshot is None:
+                return None
+            opportunities, fetched_at = list(snapshot.opportunities), snapshot.fetched_at
+        else:
+            with self._engines_lock:
+                engines = [self._engines.get((sport, region, market_key.strip())) for market_key in market.split(",")]
+            if not any(engines):
+                return None
+            opportunities = [opp for engine in engines if engine is not None for opp in engine.opportunities()]
+            opportunities.sort(key=lambda x: x["profit_percent"], reverse=True)
+            fetched_at = self._fetched_at.get(key, 0.0)
+        
+        return [dict(opp, stale=True, fetched_at=fetched_at) for opp in opportunities]
     
-    def find_arbitrage_opportunities(self, min_profit: float = 1.0) -> List[Dict[str, Any]]:
+    def find_arbitrage_opportunities(self, min_profit: float = 1.0, sports: Optional[List[str]] = None,
+                                     concurrent: bool = True, region: str = "eu", market: Optional[str] = None,
+                                     force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Busca oportunidades de arbitragem em vários esportes.
         
+        Com concurrent=True os esportes são buscados em paralelo numa thread pool;
+        o espaçamento entre chamadas continua a ser controlado pelo RequestScheduler,
+        que partilha o mesmo orçamento de rate limit entre todas as threads.
+        
         Args:
             min_profit: Percentual mínimo de lucro para considerar uma oportunidade
+            sports: Lista de esportes a verificar (por omissão DEFAULT_SPORTS)
+            concurrent: Se True, busca os esportes em paralelo
+            region: Região para as odds
+            market: Tipo de mercado (por omissão os mercados configurados e os outrights, ver scan_targets)
+            force_refresh: Pedir dados novos mesmo que os snapshots ainda sejam válidos
             
         Returns:
             Lista de oportunidades de arbitragem
         """
+        # Pares (esporte, mercado) a procurar, incluindo os códigos de outrights
+        targets = self.scan_targets(sports, market)
+        
+        def fetch_sport(sport, sport_market):
+            return self.get_sport_opportunities(sport, region=region, market=sport_market, force_refresh=force_refresh)
+        
+        if concurrent and len(targets) > 1:
+            workers = min(self.max_workers, len(targets))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="odds-fetch") as executor:
+                futures = [(sport, executor.submit(fetch_sport, sport, sport_market)) for sport, sport_market in targets]
+                # Recolher pela ordem original para manter o resultado determinístico
+                results = []
+                for sport, future in futures:
+                    try:
+                        results.append((sport, future.result()))
+                    except Exception as e:
+                        print(f"Erro ao buscar oportunidades para {sport}: {e}")
+        else:
+            results = []
+            for sport, sport_market in targets:
+                try:
+                    results.append((sport, fetch_sport(sport, sport_market)))
+                except Exception as e:
+                    print(f"Erro ao buscar oportunidades para {sport}: {e}")
+        
+        return self._merge_opportunities(results, min_profit)
+    
+    def get_cached_opportunities(self, min_profit: float = 1.0, sports: Optional[List[str]] = None,
+                                 region: str = "eu", market: Optional[str] = None) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Junta as oportunidades já publicadas na snapshot store, sem chamar a API.
+        
+        Args:
+            min_profit: Percentual mínimo de lucro para considerar uma oportunidade
+            sports: Lista de esportes a incluir (por omissão DEFAULT_SPORTS)
+            region: Região para as odds
+            market: Tipo de mercado (por omissão os mercados configurados e os outrights, ver scan_targets)
+            
+        Returns:
+            Tuple com (oportunidades, timestamp do snapshot mais antigo ou 0 se não houver dados);
+            esportes cuja última busca falhou vêm marcados com stale=True
+        """
+        if self.snapshot_store is None:
+            return [], 0
+        
+        results = []
+        fetched_at = []
+        for sport, sport_market in self.scan_targets(sports, market, fetch=False):
+            key = (sport, region, sport_market)
+            if key in self.fetch_errors:
+                opportunities = self.last_good_opportunities(sport, region=region, market=sport_market)
+            else:
+                snapshot = self.snapshot_store.get(key)
+                opportunities = snapshot.opportunities if snapshot is not None else None
+            if opportunities is not None:
+                results.append((sport, opportunities))
+                fetched_at.append(self.snapshot_store.get(key).fetched_at)
+        
+        return self._merge_opportunities(results, min_profit), min(fetched_at, default=0)
+    
+    @staticmethod
+    def _merge_opportunities(results: List[Tuple[str, Any]], min_profit: float) -> List[Dict[str, Any]]:
+        """Filtra as oportunidades de cada esporte pelo lucro mínimo e ordena o conjunto."""
         all_opportunities = []
         
-        # Lista de esportes populares para procurar oportunidades
-        sports_to_check = ["soccer", "tennis", "basketball", "baseball"]
-        
-        for sport in sports_to_check:
-            try:
-                sport_opps = self.get_best_odds(sport)
-                # Filtrar somente oportunidades reais com lucro mínimo
-                filtered_opps = [
-                    opp for opp in sport_opps 
-                    if opp["is_arbitrage"] and opp["profit_percent"] >= min_profit
-                ]
-                all_opportunities.extend(filtered_opps)
-            except Exception as e:
-                print(f"Erro ao buscar oportunidades para {sport}: {e}")
+        for sport, sport_opps in results:
+            # Filtrar somente oportunidades reais com lucro mínimo
+            filtered_opps = [
+                opp for opp in sport_opps 
+                if opp["is_arbitrage"] and opp["profit_percent"] >= min_profit
+            ]
+            all_opportunities.extend(filtered_opps)
         
         # Ordenar por maior lucro potencial
         all_opportunities.sort(key=lambda x: x["profit_percent"], reverse=True)
@@ -218,6 +1000,8 @@ class OddsAPI:
         """
         Faz uma requisição à API com controle de rate limit e validação de segurança.
         
+        Versão síncrona de request_async: espera pelo future do pedido agendado.
+        
         Args:
             url: URL da requisição
             params: Parâmetros da requisição
@@ -225,6 +1009,25 @@ class OddsAPI:
         Returns:
             Dados da resposta em JSON
         """
+        return self.request_async(url, params).result()
+    
+    def request_async(self, url: str, params: Dict[str, Any]) -> Future:
+        """
+        Valida o pedido, reserva a sua vaga de rate limit e agenda-o sem bloquear.
+        
+        Respostas dentro do TTL da ResponseCache são devolvidas num future já concluído.
+        
+        A reserva é feita no bucket "odds_api" do RateLimiter; o pedido espera a vaga
+        na fila do RequestScheduler, por isso quem chama pode continuar (renderizar,
+        agendar outros esportes) e só esperar pelo future quando precisar dos dados.
+        
+        Args:
+            url: URL da requisição
+            params: Parâmetros da requisição
+        
+        Returns:
+            Future com os dados da resposta em JSON
+        """
         # Verificar se a API key está disponível
         if not self.api_key:
             raise ValueError("API key não configurada")
@@ -240,25 +1043,134 @@ class OddsAPI:
                 safe_params[key] = value[:100]  # Limitar tamanho
             else:
                 safe_params[key] = value
-        # Aguardar pelo menos 1 segundo entre chamadas para respeitar o rate limit
-        current_time = time.time()
-        if current_time - self.last_call < 1:
-            time.sleep(1 - (current_time - self.last_call))
         
-        response = requests.get(url, params=params)
-        self.last_call = time.time()
-        self.api_calls += 1
+        # Resposta recente em cache: não gasta vaga de rate limit nem quota
+        cached = self.response_cache.get_fresh(ResponseCache.key(url, safe_params))
+        if cached is not None:
+            result = Future()
+            result.set_result(cached.data)
+            return result
         
-        if response.status_code != 200:
-            error_msg = f"Erro na API (status {response.status_code}): {response.text}"
-            raise Exception(error_msg)
+        endpoint = self._endpoint(url)
+        if not self._breaker(endpoint).allow():
+            raise OddsAPIUnavailableError(f"Endpoint {endpoint} temporariamente indisponível", endpoint=endpoint)
+        
+        result = Future()
+        self._schedule_attempt(url, safe_params, endpoint, 0, result, self.rate_limiter.reserve("odds_api"))
+        return result
+    
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Espera antes de repetir um pedido: backoff exponencial com jitter completo.
+        
+        Args:
+            attempt: Número da tentativa que falhou (0 = primeira)
+            retry_after: Espera mínima indicada pela API (Retry-After), se houver
+        
+        Returns:
+            Espera em segundos
+        """
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+    
+    @classmethod
+    def _endpoint(cls, url: str) -> str:
+        """
+        Caminho do pedido usado como chave do circuit breaker (ex: 'sports/soccer_epl/odds').
+        
+        Cada esporte tem o seu próprio breaker: um esporte que falha sempre abre o seu
+        circuito mesmo com os outros a responder, e não bloqueia os esportes saudáveis.
+        """
+        path = url[len(cls.BASE_URL):].strip("/")
+        return f"sports/{path}" if path else "sports"
+    
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        """Devolve (criando se necessário) o circuit breaker de um endpoint."""
+        with self._breakers_lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker()
+            return breaker
+    
+    def _schedule_attempt(self, url: str, params: Dict[str, Any], endpoint: str, attempt: int,
+                          result: Future, delay: float) -> None:
+        """Agenda uma tentativa do pedido e liga o seu desfecho ao future devolvido a quem chamou."""
+        future = self.scheduler.schedule(delay, lambda: self._send_request(url, params, endpoint))
+        result.add_done_callback(lambda done: done.cancelled() and future.cancel())
+        future.add_done_callback(
+            lambda done: self._on_attempt_done(done, url, params, endpoint, attempt, result)
+        )
+    
+    def _on_attempt_done(self, future: Future, url: str, params: Dict[str, Any], endpoint: str,
+                         attempt: int, result: Future) -> None:
+        """Conclui o pedido ou reagenda-o com backoff se o erro for temporário."""
+        if future.cancelled() or result.done():
+            return
+        
+        breaker = self._breaker(endpoint)
+        error = future.exception()
+        if error is None:
+            breaker.record_success()
+            result.set_result(future.result())
+            return
         
-        # Verificar cabeçalhos para informações sobre o rate limit
-        remaining = response.headers.get("x-rate-limit-remaining", "Desconhecido")
-        used = response.headers.get("x-rate-limit-requests-used", "Desconhecido") 
-        print(f"Chamadas restantes: {remaining}, Utilizadas: {used}")
+        if isinstance(error, OddsAPIError) and error.retryable:
+            breaker.record_failure()
+            if attempt < self.max_retries and breaker.allow():
+                delay = max(self.backoff_delay(attempt, error.retry_after), self.rate_limiter.reserve("odds_api"))
+                self._schedule_attempt(url, params, endpoint, attempt + 1, result, delay)
+                return
+        else:
+            # A API respondeu (erro do pedido, não do serviço): o endpoint está saudável
+            breaker.record_success()
+        
+        result.set_exception(error)
+    
+    def _http_get(self, url: str, params: Dict[str, Any], endpoint: str,
+                  headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Faz um GET à API e contabiliza a chamada e a quota reportada."""
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout, headers=headers)
+        except requests.RequestException as e:
+            raise OddsAPIServerError(f"Falha de ligação à API: {e}", endpoint=endpoint) from e
+        
+        with self._rate_lock:
+            self.last_call = time.time()
+            self.api_calls += 1
+        
+        # Quota restante/utilizada alimenta o planeamento das próximas atualizações
+        # (também nas respostas de erro, que indicam quando a quota se esgotou)
+        self.quota.update(response.headers)
+        return response
+    
+    def _send_request(self, url: str, params: Dict[str, Any], endpoint: str) -> Any:
+        """Executa o pedido HTTP quando a sua vaga chega (numa thread do RequestScheduler)."""
+        cache_key = ResponseCache.key(url, params)
+        response = self._http_get(url, params, endpoint, self.response_cache.conditional_headers(cache_key))
+        
+        # 304: o corpo guardado continua válido
+        if response.status_code == 304:
+            cached = self.response_cache.revalidate(cache_key)
+            if cached is not None:
+                return cached.data
+            
+            # A entrada saiu da cache antes de a resposta chegar: pedir o corpo completo uma vez
+            response = self._http_get(url, params, endpoint)
+        
+        if response.status_code != 200:
+            raise classify_error(response.status_code, response.text, endpoint, response.headers)
         
-        return response.json()
+        try:
+            entry = self.response_cache.store(
+                cache_key,
+                response.content,
+                response.json,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+        except ValueError as e:
+            raise OddsAPIServerError(f"Resposta inválida da API: {e}", response.status_code, endpoint) from e
+        return entry.data
 
 
 # Função auxiliar para converter uma oportunidade em odds simples
@@ -0,0 +1,194 @@
+"""
+Serviço de atualização de odds em segundo plano
+
+O poller corre numa thread do próprio processo do Streamlit: a snapshot store
+vive em memória, por isso um processo separado não a partilharia com a aplicação.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import odds_api
+from odds_snapshot import snapshot_store
+
+
+class OddsPoller:
+    """
+    Atualiza periodicamente as odds numa thread própria e publica snapshots.
+    
+    A interface apenas lê os snapshots publicados na OddsSnapshotStore,
+    por isso a renderização das páginas nunca espera pela rede. Cada esporte tem
+    o seu próprio intervalo, calculado pelo QuotaScheduler do cliente a partir da
+    quota restante e da proximidade dos seus eventos. Os códigos de outrights dos
+    esportes são planeados como esportes próprios (ver OddsAPI.scan_targets).
+    """
+    
+    def __init__(self, api: odds_api.OddsAPI, interval: float = 60.0, min_profit: float = 0.5,
+                 sports: Optional[List[str]] = None, region: str = "eu", market: Optional[str] = None):
+        """
+        Inicializa o poller.
+        
+        Args:
+            api: Cliente da API (deve ter uma snapshot_store configurada)
+            interval: Intervalo base (segundos) dos esportes com eventos a decorrer
+            min_profit: Lucro mínimo usado na busca
+            sports: Esportes a atualizar (por omissão os do cliente)
+            region: Região para as odds
+            market: Mercado(s) separados por vírgula (por omissão os mercados e outrights do cliente)
+        """
+        self.api = api
+        self.interval = interval
+        self.min_profit = min_profit
+        self.sports = sports
+        self.region = region
+        self.market = market
+        
+        self.last_run = 0.0
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        
+        # Mercados, última atualização e intervalo planeado de cada esporte
+        self.targets: Dict[str, str] = {}
+        self.last_refresh: Dict[str, float] = {}
+        self.intervals: Dict[str, float] = {}
+        self._refresh_all = True
+        
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def is_running(self) -> bool:
+        """Indica se a thread de atualização está ativa."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> None:
+        """Arranca a thread de atualização (não faz nada se já estiver ativa)."""
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="odds-poller", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Pede à thread para parar e aguarda que termine."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def request_refresh(self) -> None:
+        """Antecipa a atualização de todos os esportes sem bloquear quem chama."""
+        self._refresh_all = True
+        self._wake_event.set()
+    
+    def due_sports(self, now: Optional[float] = None) -> List[str]:
+        """
+        Replaneia os intervalos e devolve os esportes cuja atualização está em atraso.
+        
+        Args:
+            now: Instante de referência (por omissão o atual)
+        
+        Returns:
+            Esportes a atualizar, dos mais prioritários (intervalo mais curto) para os restantes
+        """
+        now = time.time() if now is None else now
+        self.targets = dict(self.api.scan_targets(self.sports, self.market))
+        next_starts = {
+            sport: self.api.next_event_start(sport, region=self.region, market=market)
+            for sport, market in self.targets.items()
+        }
+        self.intervals = self.api.quota.plan(self.interval, next_starts, now)
+        
+        due = [
+            sport for sport in self.targets
+            if now - self.last_refresh.get(sport, 0.0) >= self.intervals[sport]
+        ]
+        return sorted(due, key=lambda sport: self.intervals[sport])
+    
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """Tempo até ao próximo esporte ficar em atraso (limitado entre 1s e 1h)."""
+        now = time.time() if now is None else now
+        waits = [
+            self.last_refresh.get(sport, 0.0) + interval - now
+            for sport, interval in self.intervals.items()
+        ]
+        return min(max(min(waits, default=self.interval), 1.0), 3600.0)
+    
+    def poll_once(self) -> None:
+        """Atualiza os esportes em atraso (ou todos, após request_refresh) e publica os snapshots."""
+        if self._refresh_all:
+            self._refresh_all = False
+            self.targets = dict(self.api.scan_targets(self.sports, self.market))
+            sports = list(self.targets)
+        else:
+            sports = self.due_sports()
+        
+        if not sports:
+            return
+        
+        # Uma busca por mercado: esportes com jogos e códigos de outrights pedem mercados diferentes
+        by_market: Dict[str, List[str]] = {}
+        for sport in sports:
+            by_market.setdefault(self.targets[sport], []).append(sport)
+        
+        try:
+            for market, market_sports in by_market.items():
+                self.api.find_arbitrage_opportunities(
+                    min_profit=self.min_profit,
+                    sports=market_sports,
+                    region=self.region,
+                    market=market,
+                    force_refresh=True
+                )
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Erro na atualização de odds em segundo plano: {e}")
+        finally:
+            self.last_run = time.time()
+            self.runs += 1
+            for sport in sports:
+                self.last_refresh[sport] = self.last_run
+            # Replanear já com os eventos e a quota da atualização que acabou de terminar
+            self.due_sports(self.last_run)
+    
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.poll_once()
+            self._wake_event.wait(self.seconds_until_next())
+            self._wake_event.clear()
+
+
+_poller: Optional[OddsPoller] = None
+_poller_lock = threading.Lock()
+
+
+def start_background_poller(api: Optional[odds_api.OddsAPI] = None,
+                            interval: Optional[float] = None) -> Optional[OddsPoller]:
+    """
+    Arranca o poller do processo uma única vez e devolve-o.
+    
+    Args:
+        api: Cliente da API (por omissão um novo cliente ligado à snapshot store partilhada)
+        interval: Intervalo base entre atualizações (por omissão ODDS_POLL_INTERVAL ou 60s)
+    
+    Returns:
+        Poller ativo, ou None se a ODDS_API_KEY não estiver configurada
+    """
+    global _poller
+    with _poller_lock:
+        if _poller is not None:
+            return _poller
+        
+        api = api or odds_api.OddsAPI(snapshot_store=snapshot_store)
+        if not api.api_key:
+            return None
+        
+        if interval is None:
+            interval = float(os.environ.get("ODDS_POLL_INTERVAL", 60))
+        
+        _poller = OddsPoller(api, interval=interval)
+        _poller.start()
+        return _poller
@@ -0,0 +1,198 @@
+"""
+Planeamento das chamadas à The Odds API em função da quota restante
+"""
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Mapping, Optional
+
+# Cabeçalhos de quota devolvidos pela API (os nomes x-rate-limit-* são os antigos)
+REMAINING_HEADERS = ("x-requests-remaining", "x-rate-limit-remaining")
+USED_HEADERS = ("x-requests-used", "x-rate-limit-requests-used")
+LAST_COST_HEADERS = ("x-requests-last",)
+
+
+def _header_number(headers: Mapping[str, Any], names) -> Optional[float]:
+    """Lê o primeiro cabeçalho numérico presente, ou None."""
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class QuotaScheduler:
+    """
+    Distribui a quota restante da API pelo tempo que falta até ao fim do período de faturação.
+    
+    A quota é lida dos cabeçalhos de cada resposta. O intervalo de atualização de
+    cada esporte depende da prioridade dos seus eventos (a decorrer ou a começar
+    em breve primeiro) e é esticado de forma contínua quando o consumo previsto
+    ultrapassa o orçamento disponível, em vez de esgotar a quota e falhar.
+    """
+    
+    def __init__(self, reset_day: int = 1, reserve: float = 0.02, near_start_window: float = 2 * 3600,
+                 idle_factor: float = 6.0, max_backoff: float = 60.0):
+        """
+        Inicializa o planeador.
+        
+        Args:
+            reset_day: Dia do mês (UTC) em que a quota é reposta
+            reserve: Fração da quota guardada para pedidos interativos
+            near_start_window: Janela (segundos) em que um evento conta como "a começar"
+            idle_factor: Multiplicador do intervalo para esportes sem eventos próximos
+            max_backoff: Multiplicador máximo aplicado quando a quota está a acabar
+        """
+        self.reset_day = min(max(int(reset_day), 1), 28)
+        self.reserve = reserve
+        self.near_start_window = near_start_window
+        self.idle_factor = idle_factor
+        self.max_backoff = max_backoff
+        
+        self._lock = threading.Lock()
+        self.remaining: Optional[float] = None
+        self.used: Optional[float] = None
+        self.call_cost = 1.0
+        self.updated_at = 0.0
+    
+    def update(self, headers: Mapping[str, Any]) -> None:
+        """
+        Atualiza o estado da quota a partir dos cabeçalhos de uma resposta.
+        
+        Args:
+            headers: Cabeçalhos HTTP da resposta
+        """
+        remaining = _header_number(headers, REMAINING_HEADERS)
+        used = _header_number(headers, USED_HEADERS)
+        last_cost = _header_number(headers, LAST_COST_HEADERS)
+        
+        with self._lock:
+            if remaining is not None:
+                self.remaining = remaining
+            if used is not None:
+                self.used = used
+            if last_cost is not None and last_cost > 0:
+                # Média móvel do custo de uma chamada (mercados x regiões)
+                self.call_cost = 0.8 * self.call_cost + 0.2 * last_cost
+            self.updated_at = time.time()
+    
+    def _quota(self, now: float):
+        """Devolve (restante, utilizada), ou (None, None) se o período da última leitura já terminou."""
+        with self._lock:
+            remaining, used, updated_at = self.remaining, self.used, self.updated_at
+        if remaining is None or now >= self.next_reset(updated_at):
+            return None, None
+        return remaining, used
+    
+    @property
+    def exhausted(self) -> bool:
+        """Indica se a API reportou que a quota do período atual acabou."""
+        remaining, _ = self._quota(time.time())
+        return remaining is not None and remaining <= 0
+    
+    def next_reset(self, now: Optional[float] = None) -> float:
+        """
+        Devolve o timestamp do próximo reinício da quota.
+        
+        Args:
+            now: Instante de referência (por omissão o atual)
+        
+        Returns:
+            Timestamp UTC do início do próximo período de faturação
+        """
+        now = time.time() if now is None else now
+        current = datetime.fromtimestamp(now, tz=timezone.utc)
+        reset = current.replace(day=self.reset_day, hour=0, minute=0, second=0, microsecond=0)
+        if reset.timestamp() <= now:
+            if reset.month == 12:
+                reset = reset.replace(year=reset.year + 1, month=1)
+            else:
+                reset = reset.replace(month=reset.month + 1)
+        return reset.timestamp()
+    
+    def budget_rate(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        Taxa sustentável de consumo (unidades de quota por segundo) até ao reinício.
+        
+        Returns:
+            Taxa em unidades/segundo, ou None se a quota do período atual for desconhecida
+        """
+        now = time.time() if now is None else now
+        remaining, used = self._quota(now)
+        if remaining is None:
+            return None
+        
+        total = remaining + (used or 0)
+        usable = remaining - self.reserve * total
+        return max(usable, 0.0) / max(self.next_reset(now) - now, 1.0)
+    
+    def priority_factor(self, next_start: Optional[float], now: Optional[float] = None) -> float:
+        """
+        Multiplicador do intervalo base conforme o evento mais próximo de um esporte.
+        
+        Args:
+            next_start: Timestamp de início do evento mais cedo (None se não houver eventos)
+            now: Instante de referência
+        
+        Returns:
+            1 para eventos a decorrer, entre 1 e 2 para eventos a começar, idle_factor nos restantes casos
+        """
+        now = time.time() if now is None else now
+        if next_start is None:
+            return self.idle_factor
+        if next_start <= now:
+            return 1.0
+        if next_start - now <= self.near_start_window:
+            return 1.0 + (next_start - now) / self.near_start_window
+        return self.idle_factor
+    
+    def plan(self, base_interval: float, next_starts: Dict[str, Optional[float]],
+             now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Calcula o intervalo de atualização de cada esporte.
+        
+        Os intervalos por prioridade são esticados pelo mesmo fator quando o consumo
+        previsto (custo por chamada / intervalo, somado) excede o orçamento sustentável.
+        Com a quota esgotada todos os intervalos são infinitos até ao reinício.
+        
+        Args:
+            base_interval: Intervalo (segundos) dos esportes com eventos a decorrer
+            next_starts: Início do evento mais cedo de cada esporte
+            now: Instante de referência
+        
+        Returns:
+            Intervalo em segundos por esporte
+        """
+        now = time.time() if now is None else now
+        if self.exhausted:
+            return {sport: math.inf for sport in next_starts}
+        
+        intervals = {
+            sport: base_interval * self.priority_factor(next_start, now)
+            for sport, next_start in next_starts.items()
+        }
+        
+        budget = self.budget_rate(now)
+        if budget is not None and intervals:
+            demand = sum(self.call_cost / interval for interval in intervals.values())
+            stretch = demand / budget if budget > 0 else math.inf
+            stretch = min(max(stretch, 1.0), self.max_backoff)
+            intervals = {sport: interval * stretch for sport, interval in intervals.items()}
+        
+        return intervals
+    
+    def stats(self) -> Dict[str, Any]:
+        """Devolve o estado atual da quota para diagnóstico."""
+        with self._lock:
+            return {
+                "remaining": self.remaining,
+                "used": self.used,
+                "call_cost": self.call_cost,
+                "updated_at": self.updated_at,
+                "next_reset": self.next_reset()
+            }
@@ -0,0 +1,133 @@
+"""
+Cache de snapshots de odds partilhada por todas as sessões do processo
+"""
+import threading
+import time
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+SnapshotKey = Tuple[str, str, str]  # (sport, region, market)
+
+
+class OddsSnapshot(NamedTuple):
+    """Resultado imutável de uma busca de oportunidades para uma chave."""
+    key: SnapshotKey
+    opportunities: Tuple[Any, ...]
+    fetched_at: float
+    
+    @property
+    def age(self) -> float:
+        """Idade do snapshot em segundos."""
+        return time.time() - self.fetched_at
+
+
+def freeze(value: Any) -> Any:
+    """
+    Converte dicionários e listas em estruturas só de leitura.
+    
+    Args:
+        value: Valor a congelar
+    
+    Returns:
+        MappingProxyType para dicionários, tuplos para listas, o próprio valor caso contrário
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class OddsSnapshotStore:
+    """
+    Guarda snapshots de oportunidades por (sport, region, market) com TTL.
+    
+    Pedidos simultâneos para a mesma chave são agrupados num único fetch
+    (single-flight): quem chega enquanto um fetch está em curso espera pelo
+    mesmo resultado em vez de gastar outra chamada à API.
+    """
+    
+    def __init__(self, ttl: float = 60.0, min_refresh_interval: float = 15.0):
+        """
+        Inicializa a store.
+        
+        Args:
+            ttl: Tempo de vida de um snapshot em segundos
+            min_refresh_interval: Idade mínima para um refresh forçado gerar novo fetch
+        """
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+        self._snapshots: Dict[SnapshotKey, OddsSnapshot] = {}
+        self._inflight: Dict[SnapshotKey, Future] = {}
+    
+    def get(self, key: SnapshotKey) -> Optional[OddsSnapshot]:
+        """Devolve o último snapshot da chave, independentemente da idade."""
+        with self._lock:
+            return self._snapshots.get(key)
+    
+    def publish(self, key: SnapshotKey, opportunities: List[Dict[str, Any]]) -> OddsSnapshot:
+        """
+        Publica um novo snapshot para a chave.
+        
+        Args:
+            key: Chave (sport, region, market)
+            opportunities: Oportunidades calculadas
+        
+        Returns:
+            Snapshot publicado
+        """
+        snapshot = OddsSnapshot(key, freeze(opportunities), time.time())
+        with self._lock:
+            self._snapshots[key] = snapshot
+        return snapshot
+    
+    def get_or_fetch(self, key: SnapshotKey, fetch: Callable[[], List[Dict[str, Any]]],
+                     force_refresh: bool = False) -> OddsSnapshot:
+        """
+        Devolve o snapshot da chave, buscando-o apenas se necessário.
+        
+        Args:
+            key: Chave (sport, region, market)
+            fetch: Função que calcula as oportunidades a partir da API
+            force_refresh: Pedir dados novos mesmo que o snapshot ainda esteja dentro do TTL
+        
+        Returns:
+            Snapshot atual da chave
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                max_age = self.min_refresh_interval if force_refresh else self.ttl
+                if snapshot.age < max_age:
+                    return snapshot
+            
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not is_leader:
+            return future.result()
+        
+        try:
+            snapshot = self.publish(key, fetch())
+            future.set_result(snapshot)
+            return snapshot
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+    
+    def clear(self) -> None:
+        """Remove todos os snapshots guardados."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+# Store partilhada pelo processo
+snapshot_store = OddsSnapshotStore()
@@ -6,6 +6,7 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 import database as db
+from migrations import ensure_schema
 
 class PaymentSystem:
     """Sistema de pagamentos e subscrições."""
@@ -163,13 +164,14 @@ class PaymentSystem:
             
             conn.commit()
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             
             return True
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return False
     
     @staticmethod
@@ -198,7 +200,8 @@ class PaymentSystem:
             
             result = cursor.fetchone()
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             
             if not result:
                 return {"active": False}
@@ -218,7 +221,7 @@ class PaymentSystem:
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return {"active": False}
 
 def show_pricing_page():
@@ -388,39 +391,5 @@ def show_payment_options(plan_id: str):
     """)
 
 def init_payment_system():
-    """Inicializa o sistema de pagamentos."""
-    
-    # Criar tabela de transacções se não existir
-    conn = db.get_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id),
-                    plan_id VARCHAR(50) NOT NULL,
-                    amount DECIMAL(10,2) NOT NULL,
-                    currency VARCHAR(3) DEFAULT 'EUR',
-                    status VARCHAR(20) DEFAULT 'pending',
-                    payment_method VARCHAR(50),
-                    transaction_id VARCHAR(200),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            # Adicionar colunas de subscrição à tabela users se não existirem
-            cursor.execute("""
-                ALTER TABLE users 
-                ADD COLUMN IF NOT EXISTS subscription_plan VARCHAR(50),
-                ADD COLUMN IF NOT EXISTS subscription_activated TIMESTAMP;
-            """)
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            if conn:
-                conn.close()
-            pass  # Tabelas já existem
\ No newline at end of file
+    """Inicializa o sistema de pagamentos, aplicando as migrações de esquema pendentes."""
+    ensure_schema()
@@ -1,8 +1,11 @@
 import re
 import html
 import streamlit as st
-from typing import Any, Union
+from typing import Any, Callable, Dict, Union
+import math
+import threading
 import time
+from collections import deque
 from functools import wraps
 
 class SecurityUtils:
@@ -92,62 +95,116 @@ class SecurityUtils:
         return SecurityUtils.sanitize_input(text)
 
 class RateLimiter:
-    """Controle de taxa de requisições para APIs."""
+    """
+    Controle de taxa de requisições para APIs (janela deslizante).
+    
+    Cada bucket nomeado guarda os instantes das chamadas numa deque ordenada:
+    as chamadas expiradas saem pela esquerda, por isso cada operação é O(1)
+    amortizado. Todas as operações são protegidas por um lock.
+    """
     
-    def __init__(self, max_calls: int = 60, time_window: int = 60):
+    def __init__(self, max_calls: int = 60, time_window: float = 60):
         """
         Inicializa o limitador de taxa.
         
         Args:
-            max_calls: Número máximo de chamadas permitidas
+            max_calls: Número máximo de chamadas permitidas por bucket
             time_window: Janela de tempo em segundos
         """
         self.max_calls = max_calls
         self.time_window = time_window
-        self.calls = []
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, deque] = {}
+    
+    def _calls(self, bucket: str, now: float) -> deque:
+        """Devolve a deque do bucket sem as chamadas fora da janela."""
+        calls = self._buckets.get(bucket)
+        if calls is None:
+            self._prune(now)
+            calls = self._buckets[bucket] = deque()
+        while calls and now - calls[0] >= self.time_window:
+            calls.popleft()
+        return calls
     
-    def is_allowed(self) -> bool:
+    def _prune(self, now: float) -> None:
+        """Descarta os buckets sem chamadas na janela (ex: de sessões que já terminaram)."""
+        idle = [name for name, calls in self._buckets.items() if not calls or now - calls[-1] >= self.time_window]
+        for name in idle:
+            del self._buckets[name]
+    
+    def is_allowed(self, bucket: str = "default") -> bool:
         """
-        Verifica se uma nova chamada é permitida.
+        Verifica se uma nova chamada é permitida e, se for, regista-a.
+        
+        Args:
+            bucket: Nome do bucket
         
         Returns:
             True se permitido, False caso contrário
         """
-        now = time.time()
-        # Remove chamadas antigas
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.time_window]
+        with self._lock:
+            now = time.time()
+            calls = self._calls(bucket, now)
+            if len(calls) < self.max_calls and (not calls or calls[-1] <= now):
+                calls.append(now)
+                return True
+            return False
+    
+    def reserve(self, bucket: str = "default") -> float:
+        """
+        Reserva a próxima vaga livre do bucket, mesmo que seja no futuro.
+        
+        Args:
+            bucket: Nome do bucket
         
-        if len(self.calls) < self.max_calls:
-            self.calls.append(now)
-            return True
-        return False
+        Returns:
+            Segundos até à vaga reservada (0 se for imediata)
+        """
+        with self._lock:
+            now = time.time()
+            calls = self._calls(bucket, now)
+            slot = now
+            if len(calls) >= self.max_calls:
+                slot = calls[-self.max_calls] + self.time_window
+            if calls:
+                # Vagas por ordem de chegada mantêm a deque ordenada
+                slot = max(slot, calls[-1])
+            calls.append(slot)
+            return max(0.0, slot - now)
     
-    def get_wait_time(self) -> int:
+    def get_wait_time(self, bucket: str = "default") -> int:
         """
         Retorna o tempo de espera até a próxima chamada permitida.
         
+        Args:
+            bucket: Nome do bucket
+        
         Returns:
             Tempo de espera em segundos
         """
-        if not self.calls:
-            return 0
-        
-        oldest_call = min(self.calls)
-        wait_time = self.time_window - (time.time() - oldest_call)
-        return max(0, int(wait_time))
+        with self._lock:
+            now = time.time()
+            calls = self._calls(bucket, now)
+            if len(calls) < self.max_calls:
+                return max(0, math.ceil(calls[-1] - now)) if calls else 0
+            wait_time = calls[-self.max_calls] + self.time_window - now
+            return max(0, math.ceil(wait_time))
 
-def rate_limit_decorator(limiter: RateLimiter):
+def rate_limit_decorator(limiter: RateLimiter, bucket: Union[str, Callable[[], str]] = "default"):
     """
     Decorator para aplicar rate limiting a funções.
     
     Args:
         limiter: Instância do RateLimiter
+        bucket: Nome do bucket usado para as chamadas da função, ou função que o
+            devolve em cada chamada (ex: um bucket por sessão ou utilizador)
     """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if not limiter.is_allowed():
-                wait_time = limiter.get_wait_time()
+            name = bucket() if callable(bucket) else bucket
+            if not limiter.is_allowed(name):
+                wait_time = limiter.get_wait_time(name)
                 st.warning(f"Muitas requisições. Aguarde {wait_time} segundos.")
                 return None
             return func(*args, **kwargs)
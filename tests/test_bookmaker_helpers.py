@@ -0,0 +1,48 @@
+"""
+Testes do arredondamento das apostas em BookmakerHelpers.optimize_stakes
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("streamlit")
+
+from bookmaker_helpers import BookmakerHelpers
+
+
+def _assert_valid(result, min_bets, max_bets, budget, unit=0.01):
+    stakes = result["stakes"]
+    assert np.allclose(np.round(stakes / unit), stakes / unit)
+    assert (stakes >= np.asarray(min_bets) - 1e-9).all()
+    assert (stakes <= np.asarray(max_bets) + 1e-9).all()
+    assert (result["total"] <= np.asarray(budget) + 1e-9).all()
+
+
+def test_rounding_keeps_arbitrage_profitable():
+    odds = [[4.9924, 1.6466, 5.2046]]
+    result = BookmakerHelpers.optimize_stakes(odds, 260.35, [[1, 5, 5]], [[50, 50, 50]])
+    
+    _assert_valid(result, [[1, 5, 5]], [[50, 50, 50]], 260.35)
+    assert result["profit"][0] >= 0
+    assert (result["stakes"][0] * np.asarray(odds[0]) >= result["total"][0] - 1e-9).all()
+
+
+def test_rounding_never_loses_on_random_arbitrage():
+    rng = np.random.default_rng(20)
+    rows, outcomes = 2000, 3
+    
+    # Margens de 1% a 5% com orçamentos e mínimos realistas
+    probabilities = rng.dirichlet(np.ones(outcomes), rows) * rng.uniform(0.95, 0.99, (rows, 1))
+    odds = np.round(1 / probabilities, 4)
+    min_bets = np.round(rng.uniform(0, 5, (rows, outcomes)), 2)
+    max_bets = np.round(rng.uniform(50, 500, (rows, outcomes)), 2)
+    budget = np.round(rng.uniform(50, 500, rows), 2)
+    
+    result = BookmakerHelpers.optimize_stakes(odds, budget, min_bets, max_bets)
+    
+    # Referência sem arredondamento: os mínimos podem tornar algumas linhas em perda
+    reference = BookmakerHelpers.optimize_stakes(odds, budget, min_bets, max_bets, unit=1e-9)
+    arbitrage = reference["feasible"] & (reference["profit"] > 0.05)
+    
+    _assert_valid(result, min_bets, max_bets, budget)
+    assert arbitrage.sum() > rows // 2
+    assert (result["profit"][arbitrage] >= -1e-9).all()
@@ -84,26 +84,13 @@ class UserManager:
         try:
             cursor = conn.cursor()
             
-            # Criar tabela de utilizadores se não existir
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    email VARCHAR(100) UNIQUE NOT NULL,
-                    password_hash BYTEA NOT NULL,
-                    salt BYTEA NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_premium BOOLEAN DEFAULT FALSE,
-                    daily_profit_target DECIMAL(10,2) DEFAULT 100.00,
-                    total_profit DECIMAL(10,2) DEFAULT 0.00,
-                    subscription_expires TIMESTAMP NULL
-                );
-            """)
-            
             # Verificar se username ou email já existem
             cursor.execute("SELECT id FROM users WHERE username = %s OR email = %s", 
                          (username, email))
             if cursor.fetchone():
+                cursor.close()
+                db.release_connection(conn)
+                conn = None
                 return {"success": False, "error": "Utilizador ou email já existem"}
             
             # Criar hash da password
@@ -119,13 +106,14 @@ class UserManager:
             user_id = cursor.fetchone()[0]
             conn.commit()
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             
             return {"success": True, "user_id": user_id}
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return {"success": False, "error": f"Erro ao criar utilizador: {str(e)}"}
     
     @staticmethod
@@ -157,7 +145,8 @@ class UserManager:
             
             user_data = cursor.fetchone()
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             
             if not user_data:
                 return None
@@ -181,7 +170,7 @@ class UserManager:
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return None
     
     @staticmethod
@@ -210,12 +199,13 @@ class UserManager:
             
             conn.commit()
             cursor.close()
-            conn.close()
+            db.release_connection(conn)
+            conn = None
             return True
             
         except Exception as e:
             if conn:
-                conn.close()
+                db.release_connection(conn)
             return False
 
 class SubscriptionManager: